@@ -0,0 +1,195 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from boxes import Boxes
+
+"""
+Индекс аннотаций в формате COCO (_annotations.coco.json)
+
+JSON разбирается один раз, bounding boxes переводятся из (x, y, w, h) в пикселях в относительные (ymin, xmin, ymax, xmax)
+сразу для всех аннотаций операциями над массивами, а результат сохраняется рядом с JSON в бинарный файл (SIDECAR_SUFFIX)
+При следующих запусках используется этот файл, пока не изменились mtime и размер JSON (если изменились - сравнивается sha1 содержимого)
+
+Аннотации хранятся отсортированными по изображениям, поэтому объекты одного изображения - непрерывный срез массивов
+"""
+
+SIDECAR_SUFFIX = ".index.npz"
+
+#Версия формата бинарного файла: при изменении формата старые файлы перестраиваются
+INDEX_VERSION = 1
+
+
+def file_sha1(path):
+    sha1 = hashlib.sha1()
+    with open(path, mode='rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            sha1.update(chunk)
+    return sha1.hexdigest()
+
+
+"""
+Индекс одного файла аннотаций
+image_ids, file_names, widths, heights - данные изображений в порядке JSON
+offsets - массив длины len(image_ids) + 1: объекты изображения i - элементы offsets[i]:offsets[i + 1] массивов boxes и category_ids
+boxes - float64, форма (A, 4), относительные координаты ymin, xmin, ymax, xmax
+category_ids - int32, форма (A,), category_id из JSON
+"""
+class AnnotationIndex:
+    def __init__(self, image_ids, file_names, widths, heights, offsets, boxes, category_ids):
+        self.image_ids = image_ids
+        self.file_names = file_names
+        self.widths = widths
+        self.heights = heights
+        self.offsets = offsets
+        self.boxes = boxes
+        self.category_ids = category_ids
+        self.positions = None
+
+    def __len__(self):
+        return len(self.image_ids)
+
+    """
+    Groundtruth объекты изображения с номером i (в порядке JSON) в виде boxes.Boxes
+    Номер класса - category_id - 1 (категория 0 в датасете - общая надкатегория)
+    """
+    def objects(self, i):
+        start, end = self.offsets[i], self.offsets[i + 1]
+        return Boxes(self.boxes[start:end], np.ones(end - start), self.category_ids[start:end] - 1, 'groundtruth')
+
+    """
+    То же, что и objects, но по image_id из JSON
+    """
+    def objects_by_id(self, image_id):
+        if self.positions is None:
+            self.positions = {image_id: i for i, image_id in enumerate(self.image_ids.tolist())}
+        return self.objects(self.positions[image_id])
+
+    """
+    Данные изображения с номером i для utils.collect_data
+    """
+    def record(self, i, folder):
+        return ImageRecord(self, i, folder)
+
+    """
+    Построение индекса по разобранному JSON
+    """
+    @staticmethod
+    def from_coco(data):
+        images_list = data["images"]
+        image_ids = np.array([image["id"] for image in images_list], dtype=np.int64)
+        file_names = np.array([image["file_name"] for image in images_list])
+        widths = np.array([image["width"] for image in images_list], dtype=np.float64)
+        heights = np.array([image["height"] for image in images_list], dtype=np.float64)
+
+        annotations_list = data["annotations"]
+        xywh = np.array([annotation["bbox"] for annotation in annotations_list], dtype=np.float64).reshape(-1, 4)
+        category_ids = np.array([annotation["category_id"] for annotation in annotations_list], dtype=np.int32)
+        annotation_image_ids = np.array([annotation["image_id"] for annotation in annotations_list], dtype=np.int64)
+
+        #Номер изображения (в порядке JSON) для каждой аннотации
+        order = np.argsort(image_ids, kind='stable')
+        if len(image_ids) == 0 and len(annotation_image_ids) != 0:
+            raise KeyError("annotation refers to image_id {}, which is not in images".format(annotation_image_ids[0]))
+        found = np.minimum(np.searchsorted(image_ids, annotation_image_ids, sorter=order), max(len(image_ids) - 1, 0))
+        positions = order[found]
+        #searchsorted находит место и для отсутствующего image_id - такие аннотации нельзя молча отнести к соседнему изображению
+        unknown = np.flatnonzero(image_ids[positions] != annotation_image_ids)
+        if len(unknown) != 0:
+            raise KeyError("annotation {} refers to image_id {}, which is not in images".format(
+                annotations_list[unknown[0]].get("id"), annotation_image_ids[unknown[0]]))
+
+        #Перевод (x, y, w, h) в пикселях в относительные (ymin, xmin, ymax, xmax) - так же, как это делалось для каждого объекта
+        width = widths[positions]
+        height = heights[positions]
+        boxes = np.empty_like(xywh)
+        boxes[:, 1] = xywh[:, 0] / width
+        boxes[:, 0] = xywh[:, 1] / height
+        boxes[:, 3] = xywh[:, 0] / width + xywh[:, 2] / width
+        boxes[:, 2] = xywh[:, 1] / height + xywh[:, 3] / height
+
+        #Сортируем аннотации по изображениям, сохраняя их порядок внутри изображения
+        by_image = np.argsort(positions, kind='stable')
+        offsets = np.zeros(len(image_ids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(positions, minlength=len(image_ids)), out=offsets[1:])
+        return AnnotationIndex(image_ids, file_names, widths.astype(np.int64), heights.astype(np.int64), offsets,
+                               boxes[by_image], category_ids[by_image])
+
+    """
+    Загрузка индекса для файла аннотаций json_path: из бинарного файла рядом с ним, если он актуален, иначе разбором JSON
+    Если бинарный файл нельзя записать (например, директория только для чтения), индекс просто строится заново при каждом запуске
+    """
+    @staticmethod
+    def load(json_path):
+        sidecar_path = json_path + SIDECAR_SUFFIX
+        stat = os.stat(json_path)
+
+        if os.path.exists(sidecar_path):
+            with np.load(sidecar_path) as sidecar:
+                version, mtime_ns, size = sidecar["meta"]
+                index = None
+                if version == INDEX_VERSION:
+                    if mtime_ns == stat.st_mtime_ns and size == stat.st_size:
+                        return AnnotationIndex.from_sidecar(sidecar)
+                    digest = file_sha1(json_path)
+                    if size == stat.st_size and str(sidecar["sha1"]) == digest:
+                        index = AnnotationIndex.from_sidecar(sidecar)
+            #JSON не изменился, изменилось только его mtime
+            if index is not None:
+                index.save(sidecar_path, stat, digest)
+                return index
+
+        with open(json_path, mode='rb') as f:
+            content = f.read()
+        index = AnnotationIndex.from_coco(json.loads(content))
+        index.save(sidecar_path, stat, hashlib.sha1(content).hexdigest())
+        return index
+
+    @staticmethod
+    def from_sidecar(sidecar):
+        return AnnotationIndex(sidecar["image_ids"], sidecar["file_names"], sidecar["widths"], sidecar["heights"],
+                               sidecar["offsets"], sidecar["boxes"], sidecar["category_ids"])
+
+    def save(self, sidecar_path, stat, digest):
+        tmp_path = sidecar_path + ".tmp.npz"
+        try:
+            np.savez(tmp_path, meta=np.array([INDEX_VERSION, stat.st_mtime_ns, stat.st_size], dtype=np.int64),
+                     sha1=np.array(digest), image_ids=self.image_ids, file_names=self.file_names, widths=self.widths,
+                     heights=self.heights, offsets=self.offsets, boxes=self.boxes, category_ids=self.category_ids)
+            os.replace(tmp_path, sidecar_path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+
+"""
+Данные одного изображения индекса в виде словаря utils.collect_data: record["path"], record["width"],
+record["height"], record["objects"]
+Значения вычисляются при обращении, поэтому groundtruth объекты (boxes.Boxes) создаются только для тех изображений,
+которые действительно обрабатываются, и не занимают память между обращениями
+"""
+class ImageRecord:
+    __slots__ = ("index", "position", "folder")
+
+    KEYS = ("path", "width", "height", "objects")
+
+    def __init__(self, index, position, folder):
+        self.index = index
+        self.position = position
+        self.folder = folder
+
+    def __getitem__(self, name):
+        if name == "objects":
+            return self.index.objects(self.position)
+        if name == "path":
+            return self.folder + "//" + str(self.index.file_names[self.position])
+        if name == "width":
+            return int(self.index.widths[self.position])
+        if name == "height":
+            return int(self.index.heights[self.position])
+        raise KeyError(name)
+
+    def keys(self):
+        return self.KEYS
@@ -0,0 +1,129 @@
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+from collections import defaultdict
+
+import numpy as np
+
+import utils
+from annotations import AnnotationIndex, SIDECAR_SUFFIX
+
+"""
+Сравнение загрузки аннотаций COCO: старый способ (разбор JSON и словарь словарей с объектом-словарем для каждой аннотации)
+и annotations.AnnotationIndex при первом запуске (разбор JSON и запись бинарного файла) и при повторном (только бинарный файл),
+а также utils.collect_data (то, что вызывает run.py) - сам вызов и обращение к groundtruth объектам всех изображений
+
+Файл аннотаций синтетический, по умолчанию 50 000 изображений и 500 000 bounding boxes
+
+Запуск из корня репозитория: python -m benchmarks.bench_annotations [--images 50000] [--boxes 500000]
+"""
+
+CLASSES = ['Fish', 'Jellyfish', 'Penguin', 'Bird', 'Shark', 'Starfish', 'Rays and skates']
+
+
+def make_coco(path, images_count, boxes_count, seed=0):
+    rnd = np.random.RandomState(seed)
+    sizes = [(1024, 768), (768, 1024), (1024, 576), (576, 1024)]
+    images = []
+    for i in range(images_count):
+        width, height = sizes[rnd.randint(len(sizes))]
+        images.append({"id": i, "license": 1, "file_name": "IMG_{}.jpg".format(i), "height": height, "width": width})
+    annotation_images = rnd.randint(images_count, size=boxes_count)
+    annotations = []
+    for k in range(boxes_count):
+        image = images[annotation_images[k]]
+        w, h = int(rnd.randint(5, image["width"] // 2)), int(rnd.randint(5, image["height"] // 2))
+        x, y = int(rnd.randint(0, image["width"] - w)), int(rnd.randint(0, image["height"] - h))
+        annotations.append({"id": k, "image_id": int(annotation_images[k]), "category_id": int(rnd.randint(1, 8)),
+                            "bbox": [x, y, w, h], "area": w * h, "segmentation": [], "iscrowd": 0})
+    categories = [{"id": 0, "name": "creatures", "supercategory": "none"}] + \
+                 [{"id": j + 1, "name": CLASSES[j], "supercategory": "creatures"} for j in range(len(CLASSES))]
+    with open(path, mode='w') as f:
+        json.dump({"images": images, "annotations": annotations, "categories": categories}, f)
+
+
+"""
+Старая реализация utils.collect_data для одного файла
+"""
+def legacy_load(path):
+    res = defaultdict()
+    with open(path, mode='r') as f:
+        data = json.loads(f.read())
+        images_list = data["images"]
+        for i in range(len(images_list)):
+            id = str(images_list[i]["id"])
+            res[id] = {"path": images_list[i]["file_name"], "objects": [], "width": images_list[i]["width"],
+                       "height": images_list[i]["height"]}
+        annotations_list = data["annotations"]
+        for i in range(len(annotations_list)):
+            id = str(annotations_list[i]["image_id"])
+            box = [0, 0, 0, 0]
+            box[1] = annotations_list[i]['bbox'][0] / res[id]['width']
+            box[0] = annotations_list[i]['bbox'][1] / res[id]['height']
+            box[3] = annotations_list[i]['bbox'][0] / res[id]['width'] + annotations_list[i]['bbox'][2] / res[id]['width']
+            box[2] = annotations_list[i]['bbox'][1] / res[id]['height'] + annotations_list[i]['bbox'][3] / res[id]['height']
+            res[id]['objects'].append({'bbox': box, 'class': CLASSES[annotations_list[i]['category_id'] - 1],
+                                       'score': 1.0, 'type': 'groundtruth'})
+    return res
+
+
+def timed(fn, *args):
+    start_time = time.perf_counter()
+    res = fn(*args)
+    return res, time.perf_counter() - start_time
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--images', type=int, default=50000)
+    parser.add_argument('--boxes', type=int, default=500000)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    try:
+        path = os.path.join(directory, '_annotations.coco.json')
+        make_coco(path, args.images, args.boxes)
+        print('Images:', args.images, ' Boxes:', args.boxes, ' JSON size: {:.1f} MB'.format(os.path.getsize(path) / 2 ** 20))
+
+        legacy, legacy_time = timed(legacy_load, path)
+        cold, cold_time = timed(AnnotationIndex.load, path)
+        warm, warm_time = timed(AnnotationIndex.load, path)
+        os.utime(path)
+        touched, touched_time = timed(AnnotationIndex.load, path)
+        lookup_start = time.perf_counter()
+        for image_id in range(0, args.images, max(1, args.images // 1000)):
+            warm.objects_by_id(image_id)
+        lookup_time = (time.perf_counter() - lookup_start) / len(range(0, args.images, max(1, args.images // 1000)))
+        data, collect_time = timed(utils.collect_data, [directory], CLASSES)
+        objects_start = time.perf_counter()
+        for record in data.values():
+            record["objects"]
+        objects_time = time.perf_counter() - objects_start
+
+        print('{:<40} {:8.3f} sec'.format('legacy (json + dicts)', legacy_time))
+        print('{:<40} {:8.3f} sec'.format('AnnotationIndex, first run (json)', cold_time))
+        print('{:<40} {:8.3f} sec'.format('AnnotationIndex, sidecar', warm_time))
+        print('{:<40} {:8.3f} sec'.format('AnnotationIndex, mtime changed (sha1)', touched_time))
+        print('{:<40} {:8.1f} us'.format('per-image lookup', 1e6 * lookup_time))
+        print('{:<40} {:8.3f} sec'.format('utils.collect_data (sidecar)', collect_time))
+        print('{:<40} {:8.3f} sec'.format('objects of every image from collect_data', objects_time))
+        print('Sidecar size: {:.1f} MB'.format(os.path.getsize(path + SIDECAR_SUFFIX) / 2 ** 20))
+
+        same = True
+        for i, image_id in enumerate(warm.image_ids.tolist()):
+            objects = warm.objects(i)
+            expected = legacy[str(image_id)]['objects']
+            if objects.boxes.tolist() != [obj['bbox'] for obj in expected] or \
+                    [CLASSES[c] for c in objects.class_ids] != [obj['class'] for obj in expected]:
+                same = False
+                break
+        print('Identical to legacy loader:', same)
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
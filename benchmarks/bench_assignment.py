@@ -0,0 +1,106 @@
+import argparse
+import time
+
+import numpy as np
+
+import matching
+from benchmarks.scenes import dense_scenes
+
+"""
+Сравнение способов сопоставления matching.match_all на синтетических плотных сценах (benchmarks/scenes.py):
+greedy - жадный алгоритм
+optimal - разреженный граф пар с iou >= порога, компоненты связности решаются отдельно
+dense - венгерский алгоритм на полной матрице iou каждого класса, без разбиения на компоненты (для сравнения)
+
+Для каждого способа выводится время на сцену, количество сопоставленных пар и сумма их iou,
+а также размеры компонент связности - от них зависит время optimal
+
+Запуск из корня репозитория: python -m benchmarks.bench_assignment [--scenes 100] [--groundtruth 60] [--predictions 300]
+"""
+
+SCORE_THRESHOLD = 0.3
+
+
+"""
+Оптимальное сопоставление венгерским алгоритмом на полной матрице каждого класса
+"""
+def match_dense(pred_boxes, pred_scores, pred_classes, gt_boxes, gt_classes, iou_threshold):
+    matched = []
+    for j in np.unique(gt_classes):
+        pred_indices = np.flatnonzero((pred_classes == j) & (pred_scores >= SCORE_THRESHOLD))
+        gt_indices = np.flatnonzero(gt_classes == j)
+        if len(pred_indices) == 0:
+            continue
+        ious = matching.iou_matrix(pred_boxes[pred_indices], gt_boxes[gt_indices])
+        weights = np.where(ious >= iou_threshold, min(ious.shape) + ious, 0.0)
+        if weights.shape[0] > weights.shape[1]:
+            cols = np.arange(weights.shape[1])
+            rows = matching.hungarian(-weights.T)
+        else:
+            rows = np.arange(weights.shape[0])
+            cols = matching.hungarian(-weights)
+        valid = weights[rows, cols] > 0
+        matched.extend(zip(pred_indices[rows[valid]], gt_indices[cols[valid]]))
+    return np.array(matched, dtype=np.int64).reshape(-1, 2)
+
+
+def component_sizes(scene, iou_threshold):
+    pred_boxes, pred_scores, pred_classes, gt_boxes, gt_classes = scene
+    pred_indices = np.flatnonzero((pred_classes >= 0) & (pred_scores >= SCORE_THRESHOLD))
+    ious = matching.iou_matrix(pred_boxes[pred_indices], gt_boxes)
+    ious[pred_classes[pred_indices][:, None] != gt_classes[None, :]] = -1
+    rows, cols = np.nonzero(ious >= iou_threshold)
+    if len(rows) == 0:
+        return []
+    components = np.array(matching.edge_components(rows.tolist(), cols.tolist(), len(pred_indices)))
+    return [len(set(rows[components == c])) + len(set(cols[components == c])) for c in np.unique(components)]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--scenes', type=int, default=100)
+    parser.add_argument('--groundtruth', type=int, default=60)
+    parser.add_argument('--predictions', type=int, default=300)
+    parser.add_argument('--classes', type=int, default=2)
+    parser.add_argument('--iou', type=float, default=0.5)
+    parser.add_argument('--repeats', type=int, default=3)
+    args = parser.parse_args()
+
+    scenes = dense_scenes(args.scenes, num_groundtruth=args.groundtruth, num_predictions=args.predictions,
+                          num_classes=args.classes)
+    sizes = [size for scene in scenes for size in component_sizes(scene, args.iou)]
+    print('Scenes: {}  groundtruth: {}  predictions: {}  classes: {}  iou threshold: {}'.format(
+        args.scenes, args.groundtruth, args.predictions, args.classes, args.iou))
+    print('Components per scene: {:.1f}  mean size: {:.1f}  max size: {}'.format(
+        len(sizes) / len(scenes), np.mean(sizes), max(sizes)))
+
+    methods = [
+        ('greedy', lambda pb, ps, pc, gb, gc: matching.match_all(pb, ps, pc, gb, np.ones(len(gb)), gc,
+                                                                 SCORE_THRESHOLD, args.iou)[0]),
+        ('optimal', lambda pb, ps, pc, gb, gc: matching.match_all(pb, ps, pc, gb, np.ones(len(gb)), gc,
+                                                                  SCORE_THRESHOLD, args.iou, 'optimal')[0]),
+        ('dense', lambda pb, ps, pc, gb, gc: match_dense(pb, ps, pc, gb, gc, args.iou)),
+    ]
+    baseline = None
+    totals = {}
+    for name, fn in methods:
+        best = None
+        for r in range(args.repeats):
+            start_time = time.perf_counter()
+            results = [fn(*scene) for scene in scenes]
+            elapsed = time.perf_counter() - start_time
+            best = elapsed if best is None else min(best, elapsed)
+        if baseline is None:
+            baseline = best
+        pairs = sum(len(matched) for matched in results)
+        iou_sum = sum(matching.iou_matrix(scene[0][matched[:, 0]], scene[3][matched[:, 1]]).diagonal().sum()
+                      for scene, matched in zip(scenes, results))
+        totals[name] = (pairs, iou_sum)
+        print('{:<8} {:8.3f} ms/scene  x{:<6.2f} pairs = {:<6} sum iou = {:10.3f}'.format(
+            name, 1000 * best / len(scenes), best / baseline, pairs, iou_sum))
+    print('optimal == dense:', totals['optimal'][0] == totals['dense'][0] and
+          abs(totals['optimal'][1] - totals['dense'][1]) < 1e-6)
+
+
+if __name__ == '__main__':
+    main()
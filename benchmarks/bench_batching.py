@@ -0,0 +1,103 @@
+import argparse
+import time
+
+import numpy as np
+
+import detectors
+import pipeline
+import utils
+
+"""
+Сравнение пропускной способности модели при размерах батча 1, 2, 4, 8
+
+Изображения синтетические, но их размеры берутся из аннотаций data/ (в raw-1024 всего несколько разных размеров)
+Модель:
+--detector stub (по умолчанию) - detectors.StubDetector, --call-overhead задает фиксированные затраты на один вызов
+--detector toy - небольшая сверточная модель, которая сохраняется в SavedModel и загружается через detectors.SavedModelDetector (нужен TensorFlow)
+--detector <путь или module handle> - любая модель, которую умеет загружать detectors.load_detector
+
+Запуск из корня репозитория: python -m benchmarks.bench_batching [--images 64] [--detector stub]
+"""
+
+CLASSES = ['Fish', 'Jellyfish', 'Penguin', 'Bird', 'Shark', 'Starfish', 'Rays and skates']
+BATCH_SIZES = [1, 2, 4, 8]
+
+
+"""
+Небольшая сверточная модель с тем же форматом выходов, что и у моделей из detectors, сохраненная в SavedModel
+Принимает батч [B, H, W, 3] любого размера
+"""
+def build_toy_saved_model(path, num_detections=100):
+    import tensorflow as tf
+
+    class ToyDetector(tf.Module):
+        def __init__(self):
+            super().__init__()
+            self.conv1 = tf.Variable(tf.random.normal([3, 3, 3, 16], seed=1) * 0.1)
+            self.conv2 = tf.Variable(tf.random.normal([3, 3, 16, 32], seed=2) * 0.1)
+            self.head = tf.Variable(tf.random.normal([32, num_detections * 5], seed=3) * 0.1)
+
+        @tf.function(input_signature=[tf.TensorSpec([None, None, None, 3], tf.float32)])
+        def serve(self, images):
+            x = tf.nn.relu(tf.nn.conv2d(images, self.conv1, strides=2, padding='SAME'))
+            x = tf.nn.relu(tf.nn.conv2d(x, self.conv2, strides=2, padding='SAME'))
+            x = tf.reduce_mean(x, axis=[1, 2])
+            x = tf.reshape(tf.sigmoid(tf.matmul(x, self.head)), [-1, num_detections, 5])
+            boxes = tf.concat([tf.minimum(x[:, :, 0:2], x[:, :, 2:4]), tf.maximum(x[:, :, 0:2], x[:, :, 2:4])], axis=2)
+            labels = tf.cast(x[:, :, 4] * len(CLASSES), tf.int32) % len(CLASSES)
+            entities = tf.gather(tf.constant(CLASSES), labels)
+            return {"detection_boxes": boxes, "detection_scores": x[:, :, 4], "detection_class_entities": entities}
+
+    model = ToyDetector()
+    tf.saved_model.save(model, path, signatures={'serving_default': model.serve})
+    return path
+
+
+def make_detector(spec, call_overhead):
+    if spec == 'stub':
+        return detectors.StubDetector(call_overhead=call_overhead)
+    if spec == 'toy':
+        import tempfile
+        return detectors.SavedModelDetector(build_toy_saved_model(tempfile.mkdtemp()))
+    return detectors.load_detector(spec)
+
+
+"""
+Синтетические изображения [1, H, W, 3] размеров из data/ (по одному случайному изображению на размер, чтобы не тратить память)
+"""
+def make_images(count, seed=0):
+    data = utils.collect_data(["data//train", "data//test", "data//valid"], CLASSES)
+    shapes = [(value["height"], value["width"]) for value in data.values()][:count]
+    rnd = np.random.RandomState(seed)
+    base = {shape: rnd.rand(1, shape[0], shape[1], 3).astype(np.float32) for shape in set(shapes)}
+    return [base[shape] for shape in shapes]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--images', type=int, default=64)
+    parser.add_argument('--detector', default='stub')
+    parser.add_argument('--call-overhead', type=float, default=0.02)
+    args = parser.parse_args()
+
+    detector = make_detector(args.detector, args.call_overhead)
+    images = make_images(args.images)
+    print('Detector:', args.detector, ' Images:', len(images), ' Shapes:', len(set(image.shape for image in images)))
+
+    #Прогрев (трассировка tf.function, выделение памяти)
+    detector.detect(images[:1])
+
+    for batch_size in BATCH_SIZES:
+        timings = pipeline.StageTimings()
+        start_time = time.perf_counter()
+        items = ((i, None, image) for i, image in enumerate(images))
+        for key, img, result, t in detectors.run_batched(detector, items, batch_size, timings=timings):
+            pass
+        elapsed = time.perf_counter() - start_time
+        calls = len(timings.times['inference'])
+        print('batch size {:<2}  calls = {:<5} {:8.2f} images/sec  {:8.4f} sec/image'.format(
+            batch_size, calls, len(images) / elapsed, elapsed / len(images)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+import argparse
+import random
+import time
+
+import numpy as np
+
+import matching
+import utils
+from boxes import Vocabulary
+
+"""
+Сравнение matching.match (отдельный вызов для каждого класса) и matching.match_objects (один вызов для всех классов)
+на аннотациях из data/
+
+Модель не запускается: для каждого изображения генерируются ~100 синтетических обнаруженных объектов
+(зашумленные копии groundtruth объектов и случайные рамки, в том числе классов, которые нас не интересуют),
+так что бенчмарк работает без сети и без GPU
+
+Запуск из корня репозитория: python -m benchmarks.bench_matching [--repeats 3]
+"""
+
+CLASSES = ['Fish', 'Jellyfish', 'Penguin', 'Bird', 'Shark', 'Starfish', 'Rays and skates']
+OTHER_CLASSES = ['Animal', 'Plant', 'Tree', 'Marine mammal', 'Marine invertebrates', 'Person']
+SCORE_THRESHOLD = 0.3
+IOU_THRESHOLD = 0.6
+PREDICTIONS_PER_IMAGE = 100
+
+
+def jitter_box(box, rnd, scale):
+    ymin, xmin, ymax, xmax = box
+    h, w = max(ymax - ymin, 0.01), max(xmax - xmin, 0.01)
+    ymin += rnd.gauss(0, scale * h)
+    xmin += rnd.gauss(0, scale * w)
+    ymax += rnd.gauss(0, scale * h)
+    xmax += rnd.gauss(0, scale * w)
+    return [min(ymin, ymax), min(xmin, xmax), max(ymin, ymax), max(xmin, xmax)]
+
+
+def random_box(rnd):
+    y, x = rnd.random(), rnd.random()
+    h, w = rnd.uniform(0.01, 0.3), rnd.uniform(0.01, 0.3)
+    return [y, x, min(y + h, 1.0), min(x + w, 1.0)]
+
+
+"""
+Синтетические обнаруженные объекты в формате boxes.Boxes.to_objects
+"""
+def synthetic_predictions(groundtruth, rnd):
+    predictions = []
+    for obj in groundtruth:
+        for k in range(rnd.randint(1, 3)):
+            predictions.append({'bbox': jitter_box(obj['bbox'], rnd, 0.1), 'score': rnd.random(),
+                                'class': obj['class'], 'type': 'prediction'})
+    while len(predictions) < PREDICTIONS_PER_IMAGE:
+        predictions.append({'bbox': random_box(rnd), 'score': rnd.random() ** 3,
+                            'class': rnd.choice(CLASSES + OTHER_CLASSES), 'type': 'prediction'})
+    predictions.sort(key=lambda obj: -obj['score'])
+    return predictions
+
+
+def run_loop(samples):
+    res = []
+    for predictions, groundtruth in samples:
+        res.append([matching.match(predictions, groundtruth, cl, SCORE_THRESHOLD, IOU_THRESHOLD) for cl in CLASSES])
+    return res
+
+
+def run_vectorized(samples):
+    res = []
+    for predictions, groundtruth in samples:
+        res.append(matching.match_objects(predictions, groundtruth, CLASSES, SCORE_THRESHOLD, IOU_THRESHOLD))
+    return res
+
+
+"""
+Только сам движок сопоставления: объекты заранее переведены в массивы, как это будет при хранении результатов модели в numpy
+"""
+def to_arrays(samples):
+    class_ids = {cl: j for j, cl in enumerate(CLASSES)}
+    res = []
+    for predictions, groundtruth in samples:
+        arrays = []
+        for objects in (predictions, groundtruth):
+            arrays.append(np.array([obj['bbox'] for obj in objects], dtype=np.float64).reshape(-1, 4))
+            arrays.append(np.array([obj['score'] for obj in objects], dtype=np.float64))
+            arrays.append(np.array([class_ids.get(obj['class'], -1) for obj in objects], dtype=np.int64))
+        res.append(arrays)
+    return res
+
+
+def run_arrays(samples):
+    return [matching.match_all(*arrays, SCORE_THRESHOLD, IOU_THRESHOLD) for arrays in samples]
+
+
+def same_results(res1, res2):
+    for image1, image2 in zip(res1, res2):
+        for (matched1, pred1, gt1), (matched2, pred2, gt2) in zip(image1, image2):
+            if [id(p) for p in pred1] != [id(p) for p in pred2] or [id(g) for g in gt1] != [id(g) for g in gt2]:
+                return False
+            if [(id(p), id(g)) for p, g in matched1] != [(id(p), id(g)) for p, g in matched2]:
+                return False
+    return len(res1) == len(res2)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeats', type=int, default=3, help='сколько раз повторить замер (берется лучшее время)')
+    args = parser.parse_args()
+
+    rnd = random.Random(0)
+    data = utils.collect_data(["data//train", "data//test", "data//valid"], CLASSES)
+    vocabulary = Vocabulary(CLASSES)
+    groundtruth = [data[key]["objects"].to_objects(vocabulary) for key in data]
+    samples = [(synthetic_predictions(objects, rnd), objects) for objects in groundtruth]
+
+    array_samples = to_arrays(samples)
+
+    timings = {}
+    results = {}
+    for name, fn, inputs in [('match (per class)', run_loop, samples),
+                             ('match_objects (all classes)', run_vectorized, samples),
+                             ('match_all (arrays only)', run_arrays, array_samples)]:
+        best = None
+        for r in range(args.repeats):
+            start_time = time.perf_counter()
+            results[name] = fn(inputs)
+            elapsed = time.perf_counter() - start_time
+            best = elapsed if best is None else min(best, elapsed)
+        timings[name] = best
+
+    print('Images:', len(samples), ' Predictions per image:', PREDICTIONS_PER_IMAGE)
+    for name, elapsed in timings.items():
+        print('{:<30} {:8.1f} ms total  {:8.3f} ms/image'.format(name, 1000 * elapsed, 1000 * elapsed / len(samples)))
+    for name in ['match_objects (all classes)', 'match_all (arrays only)']:
+        print('Speedup of {}:'.format(name), round(timings['match (per class)'] / timings[name], 2))
+    print('Identical results:', same_results(results['match (per class)'], results['match_objects (all classes)']))
+
+
+if __name__ == '__main__':
+    main()
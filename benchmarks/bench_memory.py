@@ -0,0 +1,126 @@
+import argparse
+import resource
+import subprocess
+import sys
+
+import numpy as np
+
+import detectors
+import evaluation
+import matching
+import utils
+from boxes import Boxes, Vocabulary
+
+"""
+Пиковое потребление памяти (RSS) при хранении результатов в виде списков словарей (как раньше в run.py)
+и в виде boxes.Boxes с накоплением только количеств объектов по классам (columnar),
+а также columnar вместе с кривыми precision-recall (sweep, как run.py с DO_SWEEP): evaluation.SweepAccumulator
+хранит score и результаты сопоставления каждого объекта CLASSES, поэтому его память растет линейно с размером датасета
+
+Модель не запускается: результаты для каждого изображения генерируются так же, как их возвращает detector.detect (100 объектов)
+Чтобы увидеть, как память зависит от размера датасета, изображения из data/ можно повторить --repeat раз
+Каждый режим запускается в отдельном процессе, поэтому пиковый RSS не смешивается
+
+Запуск из корня репозитория: python -m benchmarks.bench_memory [--repeat 1 4 16]
+"""
+
+CLASSES = ['Fish', 'Jellyfish', 'Penguin', 'Bird', 'Shark', 'Starfish', 'Rays and skates']
+SCORE_THRESHOLD = 0.3
+IOU_THRESHOLD = 0.6
+MODES = ['dicts', 'columnar', 'sweep']
+
+
+def synthetic_result(rnd, num_detections=100):
+    corners = rnd.rand(num_detections, 2, 2).astype(np.float32)
+    return {"detection_boxes": np.concatenate([corners.min(axis=1), corners.max(axis=1)], axis=1),
+            "detection_scores": np.sort(rnd.rand(num_detections).astype(np.float32))[::-1],
+            "detection_class_entities": detectors.StubDetector.ENTITIES[
+                rnd.randint(len(detectors.StubDetector.ENTITIES), size=num_detections)]}
+
+
+"""
+Старое представление: словари для каждого объекта, списки всех отобранных объектов по классам до конца работы
+"""
+def run_dicts(data, repeat):
+    vocabulary = Vocabulary(CLASSES)
+    rnd = np.random.RandomState(0)
+    groundtruth_arrays = [[] for i in range(len(CLASSES))]
+    predictions_arrays = [[] for i in range(len(CLASSES))]
+    matched_arrays = [[] for i in range(len(CLASSES))]
+    for r in range(repeat):
+        for key in data:
+            result = synthetic_result(rnd)
+            predicted = []
+            for i in range(len(result["detection_boxes"])):
+                predicted.append({'bbox': list(result["detection_boxes"][i]), 'score': result["detection_scores"][i],
+                                  'class': str(result["detection_class_entities"][i]).replace('b\'', '').replace('\'', ''),
+                                  'type': 'prediction'})
+            groundtruth = data[key]["objects"].to_objects(vocabulary)
+            for j in range(len(CLASSES)):
+                matched, class_predictions, class_groundtruth = matching.match(predicted, groundtruth, CLASSES[j],
+                                                                               SCORE_THRESHOLD, IOU_THRESHOLD)
+                groundtruth_arrays[j].extend(class_groundtruth)
+                predictions_arrays[j].extend(class_predictions)
+                matched_arrays[j].extend(matched)
+    return [len(matched_arrays[j]) for j in range(len(CLASSES))]
+
+
+"""
+Новое представление: boxes.Boxes и накопление количеств объектов по классам
+sweep - также накапливать кривые precision-recall (evaluation.SweepAccumulator)
+"""
+def run_columnar(data, repeat, sweep=False):
+    vocabulary = Vocabulary(CLASSES)
+    rnd = np.random.RandomState(0)
+    counts = np.zeros((3, len(CLASSES)), dtype=np.int64)
+    accumulator = evaluation.SweepAccumulator(CLASSES) if sweep else None
+    for r in range(repeat):
+        for key in data:
+            predicted = Boxes.from_detector(synthetic_result(rnd), vocabulary)
+            matched, pred_indices, gt_indices, pred_classes, gt_classes = matching.match_boxes(
+                predicted, data[key]["objects"], vocabulary, SCORE_THRESHOLD, IOU_THRESHOLD)
+            counts[0] += np.bincount(pred_classes[matched[:, 0]], minlength=len(CLASSES))
+            counts[1] += np.bincount(pred_classes[pred_indices], minlength=len(CLASSES))
+            counts[2] += np.bincount(gt_classes[gt_indices], minlength=len(CLASSES))
+            if accumulator is not None:
+                accumulator.add_image(predicted.boxes, predicted.scores, pred_classes, data[key]["objects"].boxes,
+                                      gt_classes)
+    if accumulator is not None:
+        accumulator.results()
+    return counts[0].tolist()
+
+
+def measure(mode, repeat):
+    data = utils.collect_data(["data//train", "data//test", "data//valid"], CLASSES)
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if mode == 'dicts':
+        matched = run_dicts(data, repeat)
+    else:
+        matched = run_columnar(data, repeat, sweep=(mode == 'sweep'))
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    #ru_maxrss в Linux - в килобайтах
+    print(mode, repeat, baseline, peak, sum(matched))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, nargs='+', default=[1, 4, 16])
+    parser.add_argument('--mode', choices=MODES)
+    args = parser.parse_args()
+
+    if args.mode is not None:
+        measure(args.mode, args.repeat[0])
+        return
+
+    print('{:<10} {:>7} {:>12} {:>14} {:>12}'.format('mode', 'repeat', 'peak RSS MB', 'growth MB', 'matched'))
+    for repeat in args.repeat:
+        for mode in MODES:
+            output = subprocess.run([sys.executable, '-m', 'benchmarks.bench_memory', '--mode', mode,
+                                     '--repeat', str(repeat)], capture_output=True, text=True, check=True).stdout
+            mode, repeat_str, baseline, peak, matched = output.split()
+            print('{:<10} {:>7} {:>12.1f} {:>14.1f} {:>12}'.format(mode, repeat, int(peak) / 1024,
+                                                                 (int(peak) - int(baseline)) / 1024, matched))
+
+
+if __name__ == '__main__':
+    main()
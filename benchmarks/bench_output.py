@@ -0,0 +1,121 @@
+import argparse
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+import evaluation
+import matching
+import pipeline
+import utils
+from boxes import Boxes, Vocabulary, entity_name
+from detection_cache import DetectionCache
+
+"""
+Время обработки результатов модели на одно изображение (после вызова модели): разбор меток, запись в кэш,
+сопоставление с groundtruth и накопление кривых precision-recall - без отбора и с отбором на выходном этапе
+
+Модель не запускается: результаты генерируются как у Faster R-CNN OpenImages (--detections объектов, метки из 600 классов,
+из них --target-fraction - классы CLASSES), groundtruth - из data/
+legacy - прежний Boxes.from_detector (np.unique по меткам и разбор каждой различной метки на каждом изображении)
+no filter - Boxes.from_detector без отбора (все объекты модели)
+classes - только объекты CLASSES (classes_only, как run.CLASSES_ONLY по умолчанию)
+floor X - только объекты CLASSES со score >= X
+
+Запуск из корня репозитория: python -m benchmarks.bench_output [--score-floor 0.05 0.1] [--repeat 4]
+"""
+
+CLASSES = ['Fish', 'Jellyfish', 'Penguin', 'Bird', 'Shark', 'Starfish', 'Rays and skates']
+SCORE_THRESHOLD = 0.3
+IOU_THRESHOLD = 0.6
+ENTITIES = np.array([name.encode() for name in CLASSES] + [b'Entity %d' % i for i in range(600 - len(CLASSES))],
+                    dtype=object)
+
+
+def synthetic_result(rnd, num_detections, target_fraction):
+    corners = rnd.rand(num_detections, 2, 2).astype(np.float32)
+    target = rnd.rand(num_detections) < target_fraction
+    classes = np.where(target, rnd.randint(len(CLASSES), size=num_detections),
+                       rnd.randint(len(CLASSES), len(ENTITIES), size=num_detections))
+    return {"detection_boxes": np.concatenate([corners.min(axis=1), corners.max(axis=1)], axis=1),
+            "detection_scores": np.sort(rnd.rand(num_detections).astype(np.float32) ** 3)[::-1],
+            "detection_class_entities": ENTITIES[classes]}
+
+
+def legacy_from_detector(result, vocabulary, classes_only=False, score_floor=None):
+    entities, inverse = np.unique(np.asarray(result["detection_class_entities"]), return_inverse=True)
+    ids = np.array([vocabulary.intern(entity_name(entity)) for entity in entities], dtype=np.int32)
+    return Boxes(result["detection_boxes"], result["detection_scores"], ids[inverse.reshape(-1)], 'prediction')
+
+
+"""
+Обработка результатов так же, как в run.evaluate_keys; функция возвращает времена этапов и метрики
+"""
+def process(results, data, keys, from_detector, classes_only, score_floor, cache_dir):
+    vocabulary = Vocabulary(CLASSES)
+    cache = DetectionCache(cache_dir, 'bench')
+    timings = pipeline.StageTimings()
+    sweep = evaluation.SweepAccumulator(CLASSES)
+    counts = np.zeros((3, len(CLASSES)), dtype=np.int64)
+    for k, result in enumerate(results):
+        groundtruth = data[keys[k % len(keys)]]["objects"]
+        start_time = time.perf_counter()
+        with timings.stage('extract'):
+            predicted = from_detector(result, vocabulary, classes_only, score_floor)
+        with timings.stage('cache'):
+            cache.put(str(k), predicted.boxes, predicted.scores,
+                      [vocabulary.names[class_id] for class_id in predicted.class_ids])
+        with timings.stage('match'):
+            matched, pred_indices, gt_indices, pred_classes, gt_classes = matching.match_boxes(
+                predicted, groundtruth, vocabulary, SCORE_THRESHOLD, IOU_THRESHOLD)
+            counts[0] += np.bincount(pred_classes[matched[:, 0]], minlength=len(CLASSES))
+            counts[1] += np.bincount(pred_classes[pred_indices], minlength=len(CLASSES))
+            counts[2] += np.bincount(gt_classes[gt_indices], minlength=len(CLASSES))
+        with timings.stage('aggregate'):
+            sweep.add_image(predicted.boxes, predicted.scores, pred_classes, groundtruth.boxes, gt_classes)
+        timings.add('total', time.perf_counter() - start_time)
+        timings.count('detections', len(predicted))
+    return timings, counts, sweep.results()["map"]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=4, help='сколько раз пройти по изображениям из data/')
+    parser.add_argument('--detections', type=int, default=100)
+    parser.add_argument('--target-fraction', type=float, default=0.3)
+    parser.add_argument('--score-floor', type=float, nargs='+', default=[0.05, 0.1])
+    args = parser.parse_args()
+
+    data = utils.collect_data(["data//train", "data//test", "data//valid"], CLASSES)
+    keys = list(data.keys())
+    rnd = np.random.RandomState(0)
+    results = [synthetic_result(rnd, args.detections, args.target_fraction) for i in range(args.repeat * len(keys))]
+    print('images: {}  detections per image: {}  CLASSES among them: {:.0%}'.format(
+        len(results), args.detections, args.target_fraction))
+
+    variants = [('legacy', legacy_from_detector, False, None), ('no filter', Boxes.from_detector, False, None),
+                ('classes', Boxes.from_detector, True, None)]
+    variants += [('floor {}'.format(floor), Boxes.from_detector, True, floor) for floor in args.score_floor]
+    cache_dir = tempfile.mkdtemp()
+    try:
+        baseline = None
+        for name, from_detector, classes_only, score_floor in variants:
+            timings, counts, map_value = process(results, data, keys, from_detector, classes_only, score_floor,
+                                                 cache_dir)
+            summary = timings.summary()
+            stages = summary["stages"]
+            total = stages["total"]["total"] / len(results)
+            if baseline is None:
+                baseline = (total, counts)
+            print('{:<10} {:7.1f} us/image (saved {:6.1f})  extract {:6.1f}  cache {:6.1f}  match {:6.1f}  '
+                  'aggregate {:6.1f}  detections {:5.1f}  counts same: {}  mAP = {:.4f}'.format(
+                      name, 1e6 * total, 1e6 * (baseline[0] - total),
+                      *[1e6 * stages[stage]["total"] / len(results) for stage in ('extract', 'cache', 'match', 'aggregate')],
+                      summary["counters"]["detections"] / len(results), bool((counts == baseline[1]).all()), map_value))
+    finally:
+        shutil.rmtree(cache_dir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+import argparse
+import glob
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+import utils
+from boxes import Boxes, Vocabulary
+
+"""
+Сравнение визуализации рамок: старый способ (перевод изображения в PIL и обратно и новый шрифт для каждого объекта),
+utils.draw_boxes (один проход по изображению PIL) и запись изображений с рамками через utils.ImageExporter
+
+Изображения берутся из data/ (если их нет - синтетические 1024x768), объекты синтетические:
+--objects обнаруженных объектов и столько же groundtruth объектов на изображение
+
+Запуск из корня репозитория: python -m benchmarks.bench_render [--images 20] [--objects 100]
+"""
+
+CLASSES = ['Fish', 'Jellyfish', 'Penguin', 'Bird', 'Shark', 'Starfish', 'Rays and skates']
+
+
+def load_images(count, seed=0):
+    paths = sorted(glob.glob(os.path.join('data', '*', '*.jpg')))[:count]
+    if paths:
+        return [np.array(Image.open(path).convert("RGB")) for path in paths]
+    rnd = np.random.RandomState(seed)
+    return [rnd.randint(0, 256, size=(1024, 768, 3), dtype=np.uint8) for i in range(count)]
+
+
+def make_objects(count, vocabulary, seed):
+    rnd = np.random.RandomState(seed)
+    res = []
+    for kind in ('groundtruth', 'prediction'):
+        corners = rnd.rand(count, 2, 2)
+        boxes = np.concatenate([corners.min(axis=1), corners.max(axis=1)], axis=1)
+        scores = np.ones(count) if kind == 'groundtruth' else rnd.rand(count)
+        res.append(Boxes(boxes, scores, rnd.randint(vocabulary.num_classes, size=count), kind))
+    return res
+
+
+"""
+Старая реализация utils.draw_boxes (текст рисуется заново для каждого объекта, размеры подписи - utils.text_size,
+так как в новых версиях Pillow нет font.getsize)
+"""
+def legacy_draw_boxes(image, objects, vocabulary, min_score):
+    font = ImageFont.load_default()
+    colors = {'groundtruth': 'blue', 'prediction': 'red', 'match': 'green'}
+
+    for part in objects:
+        color = colors[part.kind]
+        for i in range(len(part)):
+            score = part.scores[i]
+            if score >= min_score:
+                ymin, xmin, ymax, xmax = tuple(part.boxes[i])
+                display_str = "{}: {}%".format(vocabulary.names[part.class_ids[i]], int(100 * score))
+
+                image_pil = Image.fromarray(np.uint8(image)).convert("RGB")
+                draw = ImageDraw.Draw(image_pil)
+                im_width, im_height = image_pil.size
+                left, right, top, bottom = xmin * im_width, xmax * im_width, ymin * im_height, ymax * im_height
+                draw.line([(left, top), (left, bottom), (right, bottom), (right, top), (left, top)], width=4,
+                          fill=color)
+                text_width, text_height = utils.text_size(font, display_str)
+                margin = np.ceil(0.05 * text_height)
+                text_bottom = top if top > 1.1 * text_height else top + 1.1 * text_height
+                draw.rectangle([(left, text_bottom - text_height - 2 * margin), (left + text_width, text_bottom)],
+                               fill=color)
+                draw.text((left + margin, text_bottom - text_height - margin), display_str, fill="black", font=font)
+                np.copyto(image, np.array(image_pil))
+    return image
+
+
+def measure(name, fn, images, scenes, vocabulary, min_score):
+    start_time = time.perf_counter()
+    for image, objects in zip(images, scenes):
+        fn(image.copy(), objects, vocabulary, min_score)
+    elapsed = time.perf_counter() - start_time
+    print('{:<22} {:8.2f} ms / image'.format(name, 1000 * elapsed / len(images)))
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--images', type=int, default=20)
+    parser.add_argument('--objects', type=int, default=100)
+    parser.add_argument('--min-score', type=float, default=0.3)
+    args = parser.parse_args()
+
+    vocabulary = Vocabulary(CLASSES)
+    images = load_images(args.images)
+    scenes = [make_objects(args.objects, vocabulary, seed) for seed in range(len(images))]
+    print('images: {}, objects per image: {} groundtruth + {} predictions'.format(len(images), args.objects,
+                                                                                  args.objects))
+
+    legacy = measure('legacy draw_boxes', legacy_draw_boxes, images, scenes, vocabulary, args.min_score)
+    #Первый проход заполняет кэш подписей, второй показывает установившийся режим
+    measure('draw_boxes (cold)', utils.draw_boxes, images, scenes, vocabulary, args.min_score)
+    single = measure('draw_boxes', utils.draw_boxes, images, scenes, vocabulary, args.min_score)
+    print('speedup: {:.1f}x'.format(legacy / single))
+
+    output_dir = tempfile.mkdtemp()
+    try:
+        start_time = time.perf_counter()
+        exporter = utils.ImageExporter(output_dir)
+        for k, (image, objects) in enumerate(zip(images, scenes)):
+            exporter.submit('{}.jpg'.format(k), image, objects, vocabulary, args.min_score)
+        submitted = time.perf_counter() - start_time
+        exporter.close()
+        total = time.perf_counter() - start_time
+        print('ImageExporter          {:8.2f} ms / image blocking the caller, {:8.2f} ms / image until written'.format(
+            1000 * submitted / len(images), 1000 * total / len(images)))
+    finally:
+        shutil.rmtree(output_dir)
+
+
+if __name__ == '__main__':
+    main()
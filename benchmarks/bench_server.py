@@ -0,0 +1,153 @@
+import argparse
+import asyncio
+import glob
+import json
+import os
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+"""
+Нагрузочный тест server.py: пропускная способность и задержки при разном количестве одновременных клиентов
+
+Сервис запускается в отдельном процессе с моделью-заглушкой detectors.StubDetector
+(--call-overhead - фиксированные затраты на вызов модели, именно их экономит micro-batching)
+или используется уже запущенный сервис (--address host:port)
+Каждый клиент держит одно соединение и отправляет JPEG из data/ по кругу, следующий запрос - после ответа на предыдущий
+
+Запуск из корня репозитория: python -m benchmarks.bench_server [--concurrency 1 2 4 8 16 32] [--requests 400]
+"""
+
+CLASSES = ['Fish', 'Jellyfish', 'Penguin', 'Bird', 'Shark', 'Starfish', 'Rays and skates']
+
+
+async def request(reader, writer, method, path, body=b''):
+    writer.write('{} {} HTTP/1.1\r\nHost: localhost\r\nContent-Length: {}\r\n\r\n'.format(method, path, len(body)).encode()
+                 + body)
+    await writer.drain()
+    head = await reader.readuntil(b'\r\n\r\n')
+    lines = head.decode('latin-1').split('\r\n')
+    status = int(lines[0].split(' ')[1])
+    length = 0
+    for line in lines[1:]:
+        if line.lower().startswith('content-length:'):
+            length = int(line.split(':', 1)[1])
+    return status, await reader.readexactly(length)
+
+
+async def client(host, port, payloads, count, offset, latencies, statuses):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        for k in range(count):
+            start_time = time.perf_counter()
+            status, body = await request(reader, writer, 'POST', '/detect', payloads[(offset + k) % len(payloads)])
+            latencies.append(time.perf_counter() - start_time)
+            statuses.append(status)
+    finally:
+        writer.close()
+
+
+async def metrics(host, port):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        status, body = await request(reader, writer, 'GET', '/metrics')
+        return json.loads(body)
+    finally:
+        writer.close()
+
+
+async def run_level(host, port, payloads, concurrency, requests_count):
+    before = (await metrics(host, port))["counters"]
+    latencies, statuses = [], []
+    per_client = max(1, requests_count // concurrency)
+    start_time = time.perf_counter()
+    await asyncio.gather(*[client(host, port, payloads, per_client, c * per_client, latencies, statuses)
+                           for c in range(concurrency)])
+    elapsed = time.perf_counter() - start_time
+    after = (await metrics(host, port))["counters"]
+
+    ok = np.array([latency for latency, status in zip(latencies, statuses) if status == 200])
+    batches = after.get('batches', 0) - before.get('batches', 0)
+    batched = after.get('batched images', 0) - before.get('batched images', 0)
+    print('concurrency {:<4} {:8.1f} req/s  p50 = {:7.1f} ms  p99 = {:7.1f} ms  mean batch = {:5.2f}  503 = {}'.format(
+        concurrency, len(ok) / elapsed, 1000 * np.percentile(ok, 50), 1000 * np.percentile(ok, 99),
+        batched / max(batches, 1), statuses.count(503)))
+
+
+async def wait_ready(host, port, timeout=60):
+    deadline = time.perf_counter() + timeout
+    while True:
+        try:
+            await metrics(host, port)
+            return
+        except OSError:
+            if time.perf_counter() > deadline:
+                raise
+            await asyncio.sleep(0.1)
+
+
+"""
+Сервис с моделью-заглушкой (запускается в отдельном процессе этим же модулем с --serve)
+"""
+def serve(args):
+    import detectors
+    import pipeline
+    import server
+
+    detector = detectors.StubDetector(call_overhead=args.call_overhead)
+    asyncio.run(server.serve(detector, CLASSES, '127.0.0.1', args.port, decode_fn=pipeline.decode_and_convert_numpy,
+                             max_batch_size=args.max_batch_size, max_latency=args.max_latency,
+                             max_queue=args.max_queue))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument('--requests', type=int, default=400, help='количество запросов на каждый уровень нагрузки')
+    parser.add_argument('--address', default=None, help='host:port уже запущенного сервиса')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--images', type=int, default=16, help='количество различных JPEG из data/')
+    parser.add_argument('--call-overhead', type=float, default=0.02)
+    parser.add_argument('--max-batch-size', type=int, default=8)
+    parser.add_argument('--max-latency', type=float, default=0.01)
+    parser.add_argument('--max-queue', type=int, default=64)
+    parser.add_argument('--serve', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args)
+        return
+
+    paths = sorted(glob.glob(os.path.join('data', '*', '*.jpg')))[:args.images]
+    payloads = []
+    for path in paths:
+        with open(path, mode='rb') as f:
+            payloads.append(f.read())
+
+    process = None
+    if args.address is None:
+        host, port = '127.0.0.1', args.port
+        process = subprocess.Popen([sys.executable, '-m', 'benchmarks.bench_server', '--serve', '--port', str(port),
+                                    '--call-overhead', str(args.call_overhead), '--max-batch-size',
+                                    str(args.max_batch_size), '--max-latency', str(args.max_latency),
+                                    '--max-queue', str(args.max_queue)])
+        print('Stub detector: call overhead = {} sec  max batch size = {}  max latency = {} sec  max queue = {}'.format(
+            args.call_overhead, args.max_batch_size, args.max_latency, args.max_queue))
+    else:
+        host, port = args.address.rsplit(':', 1)
+        port = int(port)
+
+    try:
+        asyncio.run(wait_ready(host, port))
+        for concurrency in args.concurrency:
+            asyncio.run(run_level(host, port, payloads, concurrency, args.requests))
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+import argparse
+import os
+import time
+
+import numpy as np
+
+import run
+import utils
+
+"""
+Зависимость времени оценки от количества процессов (run.py --workers N)
+
+Для каждого количества процессов запускается run.evaluate с моделью --detector (по умолчанию заглушка
+detectors.StubDetector, --call-overhead - фиксированные затраты на один ее вызов) и остальными настройками из run.py
+и проверяется, что результаты в точности совпадают с результатами в одном процессе
+Кэш результатов модели отключен, чтобы при каждом количестве процессов модель запускалась на всех изображениях
+
+Запуск из корня репозитория: python -m benchmarks.bench_workers [--workers 1 2 4 8] [--detector stub] [--call-overhead 0.02]
+"""
+
+
+def same_summaries(summary1, summary2):
+    if not np.array_equal(summary1["counts"], summary2["counts"]):
+        return False
+    if summary1["sweep"] is None:
+        return True
+    res1, res2 = summary1["sweep"].results(), summary2["sweep"].results()
+    for cl in res1["classes"]:
+        for key in ("scores", "precision", "recall", "ap"):
+            if not np.array_equal(res1["classes"][cl][key], res2["classes"][cl][key], equal_nan=True):
+                return False
+    return True
+
+
+def main():
+    cpu_count = os.cpu_count() or 1
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', type=int, nargs='+',
+                        default=[n for n in [1, 2, 4, 8, 16] if n <= cpu_count])
+    parser.add_argument('--detector', default='stub', help='module handle, путь к SavedModel или stub')
+    parser.add_argument('--call-overhead', type=float, default=0.02, help='только для stub')
+    args = parser.parse_args()
+
+    #Настройки передаются в процессы-обработчики через run.current_settings
+    run.DETECTOR = 'stub:{}'.format(args.call_overhead) if args.detector == 'stub' else args.detector
+    run.CACHE_DIR = None
+
+    res = utils.collect_data(["data//train", "data//test", "data//valid"], run.CLASSES)
+    keys = list(res.keys())
+    print('Images:', len(keys), ' CPUs:', cpu_count, ' Detector:', run.DETECTOR, ' Cache:', run.CACHE_DIR)
+
+    baseline = None
+    baseline_time = None
+    for workers in args.workers:
+        start_time = time.perf_counter()
+        summary = run.evaluate(res, keys, workers)
+        elapsed = time.perf_counter() - start_time
+        if baseline is None:
+            baseline, baseline_time = summary, elapsed
+        print('workers {:<3} wall time = {:8.2f} sec  speedup = {:5.2f}  model runs = {:<5} identical = {}'.format(
+            workers, elapsed, baseline_time / elapsed, len(summary["times"]), same_summaries(baseline, summary)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+import numpy as np
+
+"""
+Синтетические плотные сцены для бенчмарков сопоставления: стаи рыб, в которых groundtruth объекты сильно перекрываются,
+а модель дает по несколько рамок на каждый объект и случайные рамки рядом со стаями
+
+Сцена - кортеж массивов в формате matching.match_all:
+(pred_boxes, pred_scores, pred_classes, gt_boxes, gt_classes), номер класса -1 - объект не относится к интересующим классам
+"""
+
+
+def clip_boxes(centers, sizes):
+    boxes = np.concatenate([centers - sizes / 2, centers + sizes / 2], axis=1)
+    return np.clip(boxes, 0.0, 1.0)
+
+
+"""
+Одна сцена
+rnd - np.random.RandomState
+num_groundtruth - количество groundtruth объектов, num_predictions - количество обнаруженных объектов
+num_classes - количество интересующих классов, clusters - количество стай
+"""
+def dense_scene(rnd, num_groundtruth=50, num_predictions=300, num_classes=7, clusters=3):
+    cluster_centers = rnd.rand(clusters, 2) * 0.6 + 0.2
+    gt_centers = cluster_centers[rnd.randint(clusters, size=num_groundtruth)] + rnd.normal(0, 0.08, (num_groundtruth, 2))
+    gt_sizes = rnd.uniform(0.03, 0.12, (num_groundtruth, 2))
+    gt_boxes = clip_boxes(gt_centers, gt_sizes)
+    gt_classes = rnd.randint(num_classes, size=num_groundtruth)
+
+    #Несколько рамок на каждый объект: смещенные и другого размера, иногда другого класса
+    copies = rnd.randint(1, 5, size=num_groundtruth)
+    sources = np.repeat(np.arange(num_groundtruth), copies)[:num_predictions]
+    pred_centers = gt_centers[sources] + rnd.normal(0, 0.15, (len(sources), 2)) * gt_sizes[sources]
+    pred_sizes = gt_sizes[sources] * rnd.uniform(0.8, 1.25, (len(sources), 2))
+    pred_classes = np.where(rnd.rand(len(sources)) < 0.9, gt_classes[sources], rnd.randint(num_classes, size=len(sources)))
+    pred_scores = rnd.beta(4, 2, size=len(sources))
+
+    #Остальные рамки - ложные срабатывания рядом со стаями, в том числе классов, которые нас не интересуют
+    rest = num_predictions - len(sources)
+    noise_centers = cluster_centers[rnd.randint(clusters, size=rest)] + rnd.normal(0, 0.12, (rest, 2))
+    noise_sizes = rnd.uniform(0.02, 0.15, (rest, 2))
+    pred_boxes = np.concatenate([clip_boxes(pred_centers, pred_sizes), clip_boxes(noise_centers, noise_sizes)])
+    pred_scores = np.concatenate([pred_scores, rnd.rand(rest) ** 3])
+    pred_classes = np.concatenate([pred_classes, rnd.randint(-1, num_classes, size=rest)])
+
+    order = np.argsort(-pred_scores, kind='stable')
+    return pred_boxes[order], pred_scores[order], pred_classes[order], gt_boxes, gt_classes
+
+
+def dense_scenes(count, seed=0, **kwargs):
+    rnd = np.random.RandomState(seed)
+    return [dense_scene(rnd, **kwargs) for i in range(count)]
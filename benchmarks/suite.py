@@ -0,0 +1,122 @@
+import argparse
+import json
+import sys
+
+import numpy as np
+
+import evaluation
+import matching
+import pipeline
+import run
+import utils
+from benchmarks.scenes import dense_scenes
+
+"""
+Набор бенчмарков для поиска регрессий производительности на машине без GPU и без сети
+
+pipeline - run.evaluate на изображениях из data/ с моделью-заглушкой detectors.StubDetector
+(изображения декодируются через PIL, кэш результатов модели отключен), времена всех этапов обработки
+matching - matching.match_all и evaluation.SweepAccumulator.add_image на синтетических плотных сценах (benchmarks/scenes.py)
+
+Для каждого этапа сохраняются p50/p95/p99 и пиковая память (pipeline.StageTimings.summary), а также результаты
+(количества объектов, mAP), чтобы регрессией считалось и изменение результатов
+Если передан --baseline (результат предыдущего запуска), этапы, у которых p50 выросло больше чем в --tolerance раз,
+и изменившиеся результаты выводятся, а код возврата равен 1
+
+Запуск из корня репозитория: python -m benchmarks.suite [--output bench.json] [--baseline old.json] [--images 200]
+"""
+
+#Минимальное количество замеров этапа, при котором он сравнивается с предыдущим запуском
+MIN_SAMPLES = 10
+
+
+def bench_pipeline(images_count):
+    run.DETECTOR = 'stub'
+    run.CACHE_DIR = None
+    run.DO_VISUALIZE = False
+    run.DO_SWEEP = True
+
+    res = utils.collect_data(["data//train", "data//test", "data//valid"], run.CLASSES)
+    keys = list(res.keys())[:images_count]
+    summary = run.evaluate(res, keys)
+    with summary["timings"].stage('metrics'):
+        sweep_results = summary["sweep"].results()
+    return {"timings": summary["timings"],
+            "results": {"counts": summary["counts"].tolist(), "map": sweep_results["map"]}}
+
+
+def bench_matching(scenes_count, repeats):
+    scenes = dense_scenes(scenes_count)
+    timings = pipeline.StageTimings()
+    for r in range(repeats):
+        sweep = evaluation.SweepAccumulator(run.CLASSES)
+        matched_count = 0
+        for pred_boxes, pred_scores, pred_classes, gt_boxes, gt_classes in scenes:
+            with timings.stage('match_all'):
+                matched, pred_indices, gt_indices = matching.match_all(
+                    pred_boxes, pred_scores, pred_classes, gt_boxes, np.ones(len(gt_boxes)), gt_classes,
+                    run.SCORE_THRESHOLD, run.IOU_THRESHOLD)
+            with timings.stage('sweep'):
+                sweep.add_image(pred_boxes, pred_scores, pred_classes, gt_boxes, gt_classes)
+            matched_count += len(matched)
+    timings.count('scenes', scenes_count)
+    timings.count('predictions per scene', len(scenes[0][0]))
+    timings.count('groundtruth per scene', len(scenes[0][3]))
+    return {"timings": timings, "results": {"matched": matched_count, "map": sweep.results()["map"]}}
+
+
+"""
+Сравнение с результатом предыдущего запуска; функция возвращает список строк с найденными регрессиями
+"""
+def compare(current, baseline, tolerance):
+    regressions = []
+    for case, case_res in current.items():
+        if case not in baseline:
+            continue
+        if case_res["results"] != baseline[case]["results"]:
+            regressions.append('{}: results changed: {} -> {}'.format(case, baseline[case]["results"], case_res["results"]))
+        for stage, stage_res in case_res["timings"]["stages"].items():
+            old = baseline[case]["timings"]["stages"].get(stage)
+            #Этапы с единичными замерами (например, metrics) слишком шумные для сравнения
+            if old is None or old["p50"] <= 0 or min(old["n"], stage_res["n"]) < MIN_SAMPLES:
+                continue
+            ratio = stage_res["p50"] / old["p50"]
+            print('{:<10} {:<12} p50 {:10.6f} -> {:10.6f} sec  x{:.2f}'.format(case, stage, old["p50"], stage_res["p50"], ratio))
+            if ratio > tolerance:
+                regressions.append('{}: {} p50 is {:.2f}x slower'.format(case, stage, ratio))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--output', default=None, help='файл, в который сохраняются результаты (json)')
+    parser.add_argument('--baseline', default=None, help='результаты предыдущего запуска для сравнения')
+    parser.add_argument('--tolerance', type=float, default=1.25)
+    parser.add_argument('--images', type=int, default=None, help='количество изображений из data/ (по умолчанию все)')
+    parser.add_argument('--scenes', type=int, default=200)
+    parser.add_argument('--repeats', type=int, default=3)
+    args = parser.parse_args()
+
+    res = {"pipeline": bench_pipeline(args.images), "matching": bench_matching(args.scenes, args.repeats)}
+    for case, case_res in res.items():
+        print(case)
+        for line in case_res["timings"].report():
+            print('  ' + line)
+        print('  results:', case_res["results"])
+        case_res["timings"] = case_res["timings"].summary()
+
+    if args.output is not None:
+        with open(args.output, mode='w') as f:
+            json.dump(res, f, indent=2)
+    if args.baseline is not None:
+        with open(args.baseline, mode='r') as f:
+            baseline = json.load(f)
+        regressions = compare(res, baseline, args.tolerance)
+        for line in regressions:
+            print('REGRESSION', line)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
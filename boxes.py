@@ -0,0 +1,133 @@
+import numpy as np
+
+"""
+Компактное представление набора объектов одного изображения (обнаруженных или groundtruth)
+Вместо списка словарей - несколько массивов numpy и целочисленные номера классов
+"""
+
+
+"""
+Метка класса из detection_class_entities (bytes) в том же виде, в каком она всегда записывалась в результаты
+"""
+def entity_name(entity):
+    return str(entity).replace('b\'', '').replace('\'', '')
+
+
+"""
+Словарь меток классов: каждая метка получает постоянный целочисленный номер
+Первые len(classes) номеров - интересующие нас классы в порядке classes, остальные метки получают номера по мере появления
+aliases - словарь (метка модели -> метка из classes): такие метки получают номер соответствующего класса
+(например, {'Duck': 'Bird'}, если утки в датасете размечены тем же классом, что и птицы)
+"""
+class Vocabulary:
+    def __init__(self, classes, aliases=None):
+        self.num_classes = len(classes)
+        self.names = list(classes)
+        self.ids = {name: i for i, name in enumerate(self.names)}
+        for alias, name in (aliases or {}).items():
+            self.ids[alias] = self.ids[name]
+        self.remap_cache = {}
+        self.entity_cache = {}
+
+    def intern(self, name):
+        res = self.ids.get(name)
+        if res is None:
+            res = len(self.names)
+            self.ids[name] = res
+            self.names.append(name)
+        return res
+
+    """
+    Массив номеров для массива меток модели (detection_class_entities, bytes)
+    Номер каждой различной метки вычисляется один раз за все время работы, дальше - поиск в словаре
+    """
+    def entity_ids(self, entities):
+        cache = self.entity_cache
+        res = np.empty(len(entities), dtype=np.int32)
+        for i, entity in enumerate(entities):
+            class_id = cache.get(entity)
+            if class_id is None:
+                class_id = cache[entity] = self.intern(entity_name(entity))
+            res[i] = class_id
+        return res
+
+    """
+    Массив номеров для списка меток names (например, словаря DetectionCache)
+    Список names может только расти, поэтому результат для его начала запоминается
+    """
+    def remap(self, names):
+        known = self.remap_cache.get(id(names))
+        if known is None or len(known[1]) != len(names):
+            known = (names, np.array([self.intern(name) for name in names], dtype=np.int32))
+            self.remap_cache[id(names)] = known
+        return known[1]
+
+
+def as_float(values):
+    values = np.asarray(values)
+    return values if values.dtype.kind == 'f' else values.astype(np.float32)
+
+
+"""
+Набор объектов одного изображения
+boxes - форма (N, 4), относительные координаты ymin, xmin, ymax, xmax
+scores - форма (N,)
+boxes и scores хранятся в том типе, в котором переданы (float32 у модели, float64 у groundtruth), целые числа переводятся в float32
+class_ids - int32, форма (N,), номера в Vocabulary
+kind - 'prediction', 'groundtruth' или 'match' (для визуализации)
+"""
+class Boxes:
+    __slots__ = ("boxes", "scores", "class_ids", "kind")
+
+    def __init__(self, boxes, scores, class_ids, kind):
+        self.boxes = as_float(boxes).reshape(-1, 4)
+        self.scores = as_float(scores)
+        self.class_ids = np.asarray(class_ids, dtype=np.int32)
+        self.kind = kind
+
+    def __len__(self):
+        return len(self.scores)
+
+    """
+    Номера классов для matching.match_all: номер интересующего нас класса или -1
+    """
+    def target_classes(self, vocabulary):
+        return np.where(self.class_ids < vocabulary.num_classes, self.class_ids, -1)
+
+    def take(self, indices, kind=None):
+        return Boxes(self.boxes[indices], self.scores[indices], self.class_ids[indices],
+                     self.kind if kind is None else kind)
+
+    """
+    Создание из результата detector.detect для одного изображения
+    Метки классов декодируются один раз для каждой различной метки (Vocabulary.entity_ids), а не для каждого объекта
+    classes_only, score_floor - отбор объектов, см. select
+    """
+    @staticmethod
+    def from_detector(result, vocabulary, classes_only=False, score_floor=None):
+        ids = vocabulary.entity_ids(np.asarray(result["detection_class_entities"]).reshape(-1))
+        return Boxes.select(result["detection_boxes"], result["detection_scores"], ids, vocabulary, classes_only,
+                            score_floor)
+
+    """
+    Создание обнаруженных объектов из массивов с отбором над массивами, до создания Boxes:
+    classes_only - оставить только объекты интересующих нас классов (остальные не влияют на метрики: см. target_classes)
+    score_floor - оставить только объекты со score >= score_floor (None - без отбора по score)
+    """
+    @staticmethod
+    def select(boxes, scores, class_ids, vocabulary, classes_only=False, score_floor=None):
+        if classes_only or score_floor is not None:
+            scores = np.asarray(scores)
+            keep = class_ids < vocabulary.num_classes if classes_only else np.ones(len(scores), dtype=bool)
+            if score_floor is not None:
+                keep &= scores >= score_floor
+            keep = np.flatnonzero(keep)
+            boxes, scores, class_ids = np.asarray(boxes)[keep], scores[keep], class_ids[keep]
+        return Boxes(boxes, scores, class_ids, 'prediction')
+
+    """
+    Перевод в список словарей в старом формате
+    """
+    def to_objects(self, vocabulary):
+        return [{'bbox': list(self.boxes[i]), 'score': self.scores[i], 'class': vocabulary.names[self.class_ids[i]],
+                 'type': self.kind} for i in range(len(self))]
@@ -0,0 +1,134 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+
+"""
+Кэш результатов работы модели на диске
+
+Ключ - хэш содержимого изображения (sha1), кэши разных моделей лежат в разных поддиректориях (по хэшу module_handle)
+Если файл изображения изменился, меняется и его хэш, поэтому модель будет запущена заново только для изменившихся изображений
+
+Формат хранения - колоночный: все результаты лежат подряд в трех .npy-файлах, которые открываются через memory map
+boxes.npy - float32, форма (N, 4)
+scores.npy - float32, форма (N,)
+class_ids.npy - int32, форма (N,), номера в словаре меток классов
+index.json - словарь меток классов, смещение и количество объектов для каждого хэша изображения,
+а также (путь -> mtime, размер, хэш), чтобы не пересчитывать хэш неизменившихся файлов
+"""
+class DetectionCache:
+    COLUMNS = ("boxes", "scores", "class_ids")
+
+    def __init__(self, cache_dir, module_handle):
+        self.dir = os.path.join(cache_dir, hashlib.sha1(module_handle.encode()).hexdigest()[:16])
+        self.module_handle = module_handle
+        self.entities = []
+        self.entity_ids = {}
+        self.images = {}
+        self.files = {}
+        self.columns = {name: None for name in self.COLUMNS}
+        self.pending = {}
+        self.changed = False
+
+        index_path = os.path.join(self.dir, "index.json")
+        if os.path.exists(index_path):
+            with open(index_path, mode='r') as f:
+                index = json.load(f)
+            self.entities = index["entities"]
+            self.entity_ids = {entity: i for i, entity in enumerate(self.entities)}
+            self.images = {key: tuple(value) for key, value in index["images"].items()}
+            self.files = {key: tuple(value) for key, value in index["files"].items()}
+            for name in self.COLUMNS:
+                self.columns[name] = np.load(os.path.join(self.dir, name + ".npy"), mmap_mode='r')
+
+    """
+    Хэш содержимого файла изображения
+    Если mtime и размер файла не изменились с прошлого запуска, хэш берется из индекса
+    """
+    def image_hash(self, path):
+        stat = os.stat(path)
+        known = self.files.get(path)
+        if known is not None and known[0] == stat.st_mtime_ns and known[1] == stat.st_size:
+            return known[2]
+        with open(path, mode='rb') as f:
+            res = hashlib.sha1(f.read()).hexdigest()
+        self.files[path] = (stat.st_mtime_ns, stat.st_size, res)
+        self.changed = True
+        return res
+
+    """
+    Функция возвращает тройку (boxes, scores, class_ids) для изображения с данным хэшем или None, если его нет в кэше
+    Массивы numpy (при чтении с диска - memory map), class_ids - номера меток в словаре кэша self.entities
+    """
+    def get_arrays(self, image_hash):
+        if image_hash in self.pending:
+            return self.pending[image_hash]
+        if image_hash in self.images:
+            offset, count = self.images[image_hash]
+            return tuple(self.columns[name][offset:offset + count] for name in self.COLUMNS)
+        return None
+
+    def put(self, image_hash, boxes, scores, classes):
+        class_ids = []
+        for cl in classes:
+            if cl not in self.entity_ids:
+                self.entity_ids[cl] = len(self.entities)
+                self.entities.append(cl)
+            class_ids.append(self.entity_ids[cl])
+        self.pending[image_hash] = (np.asarray(boxes, dtype=np.float32).reshape(-1, 4),
+                                    np.asarray(scores, dtype=np.float32),
+                                    np.asarray(class_ids, dtype=np.int32))
+        self.changed = True
+
+    """
+    Записываем новые результаты на диск
+    Результаты изображений, хэш которых больше не встречается в self.files (файл изображения изменился),
+    при этом удаляются, поэтому кэш не растет при каждом изменении данных
+    Файлы перезаписываются целиком через временные файлы, поэтому прерванная запись не портит кэш
+    """
+    def save(self):
+        if not self.changed:
+            return
+        os.makedirs(self.dir, exist_ok=True)
+
+        referenced = {value[2] for value in self.files.values()}
+        stale = [image_hash for image_hash in self.images if image_hash not in referenced]
+        rewrite = bool(self.pending or stale) or self.columns["scores"] is None
+
+        if rewrite:
+            #Оставшиеся результаты копируются подряд, смещения пересчитываются
+            new_columns = [[] for name in self.COLUMNS]
+            images = {}
+            offset = 0
+            kept = [image_hash for image_hash in self.images if image_hash in referenced and image_hash not in self.pending]
+            for image_hash in kept + list(self.pending):
+                arrays = self.get_arrays(image_hash)
+                for j in range(len(self.COLUMNS)):
+                    new_columns[j].append(arrays[j])
+                images[image_hash] = (offset, len(arrays[1]))
+                offset += len(arrays[1])
+            self.images = images
+            arrays = None
+
+            empty = [np.zeros((0, 4), dtype=np.float32), np.zeros(0, dtype=np.float32), np.zeros(0, dtype=np.int32)]
+            for j, name in enumerate(self.COLUMNS):
+                tmp_path = os.path.join(self.dir, name + ".tmp.npy")
+                np.save(tmp_path, np.concatenate(new_columns[j]) if new_columns[j] else empty[j])
+                #memory map старого файла нужно закрыть до его замены (в Windows файл с memory map нельзя заменить):
+                #на него не должно остаться ни одной ссылки, в том числе через срезы в new_columns и arrays
+                new_columns[j] = None
+                self.columns[name] = None
+                os.replace(tmp_path, os.path.join(self.dir, name + ".npy"))
+
+        index = {"module_handle": self.module_handle, "entities": self.entities,
+                 "images": self.images, "files": self.files}
+        tmp_path = os.path.join(self.dir, "index.tmp.json")
+        with open(tmp_path, mode='w') as f:
+            json.dump(index, f)
+        os.replace(tmp_path, os.path.join(self.dir, "index.json"))
+
+        for name in self.COLUMNS:
+            self.columns[name] = np.load(os.path.join(self.dir, name + ".npy"), mmap_mode='r')
+        self.pending = {}
+        self.changed = False
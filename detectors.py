@@ -0,0 +1,277 @@
+import os
+import time
+import zlib
+
+import numpy as np
+
+"""
+Модели обнаружения объектов с общим интерфейсом
+
+detector.detect(images) принимает список тензоров [1, H, W, 3] типа float32 одинакового размера
+и возвращает список словарей (по одному на изображение) с массивами numpy:
+detection_boxes - (N, 4), относительные координаты ymin, xmin, ymax, xmax
+detection_scores - (N,)
+detection_class_entities - (N,), метки классов (bytes)
+
+supports_batching - может ли модель обработать несколько изображений за один вызов
+Если передан timings (pipeline.StageTimings), в этап 'transfer' записывается время перевода выходов модели в numpy
+(это время входит и во время вызова detect)
+Моделям TensorFlow можно передать output_filter (GraphOutputFilter) - отбор результатов до перевода в numpy
+"""
+
+
+"""
+Отбор результатов модели внутри графа TensorFlow, до перевода в numpy
+Модель OpenImages возвращает объекты всех 600 классов; здесь остаются только объекты классов classes
+(метки из aliases - словаря (метка модели -> метка из classes) - переименовываются в соответствующий класс)
+со score >= score_floor, а затем для каждого класса - не более top_k объектов после NMS с порогом nms_iou
+(nms_iou=None - без NMS, только top_k объектов с наибольшим score)
+Результат - словарь в формате detect, метки - из classes
+"""
+class GraphOutputFilter:
+    def __init__(self, classes, aliases=None, score_floor=0.0, top_k=100, nms_iou=None):
+        import tensorflow as tf
+        self.tf = tf
+        aliases = aliases or {}
+        names = list(classes) + list(aliases)
+        ids = list(range(len(classes))) + [classes.index(name) for name in aliases.values()]
+        self.table = tf.lookup.StaticHashTable(
+            tf.lookup.KeyValueTensorInitializer(tf.constant(names), tf.constant(ids, dtype=tf.int32)), default_value=-1)
+        self.class_names = tf.constant(list(classes))
+        self.num_classes = len(classes)
+        self.score_floor = float(score_floor or 0.0)
+        self.top_k = int(top_k)
+        #iou > 1 не бывает, поэтому порог 1.0 означает отбор без NMS
+        self.nms_iou = 1.0 if nms_iou is None else float(nms_iou)
+        self.filter = tf.function(self.filter_image)
+
+    def filter_image(self, boxes, scores, entities):
+        tf = self.tf
+        class_ids = self.table.lookup(entities)
+        keep = (class_ids >= 0) & (scores >= self.score_floor)
+        boxes, scores = tf.boolean_mask(boxes, keep), tf.boolean_mask(scores, keep)
+        class_ids = tf.boolean_mask(class_ids, keep)
+        #combined_non_max_suppression отбирает объекты отдельно по каждому классу: score объекта - только в столбце его класса
+        class_scores = tf.one_hot(class_ids, self.num_classes, dtype=scores.dtype) * scores[:, None]
+        nmsed_boxes, nmsed_scores, nmsed_classes, valid = tf.image.combined_non_max_suppression(
+            boxes[None, :, None, :], class_scores[None], max_output_size_per_class=self.top_k,
+            max_total_size=self.top_k * self.num_classes, iou_threshold=self.nms_iou,
+            score_threshold=self.score_floor, pad_per_class=False, clip_boxes=False)
+        count = valid[0]
+        return {"detection_boxes": nmsed_boxes[0, :count], "detection_scores": nmsed_scores[0, :count],
+                "detection_class_entities": tf.gather(self.class_names, tf.cast(nmsed_classes[0, :count], tf.int32))}
+
+    """
+    Отбор для выходов модели на одном изображении (тензоры без размерности батча)
+    """
+    def __call__(self, boxes, scores, entities):
+        return self.filter(boxes, scores, entities)
+
+
+"""
+Модель с tfhub.dev
+Сигнатура 'default' Faster R-CNN OpenImages v4 принимает только тензор [1, H, W, 3], поэтому изображения обрабатываются по одному
+"""
+class HubDetector:
+    supports_batching = False
+
+    def __init__(self, module_handle, output_filter=None):
+        import tensorflow_hub as hub
+        self.model = hub.load(module_handle).signatures['default']
+        self.output_filter = output_filter
+
+    def detect(self, images, timings=None):
+        res = []
+        for image in images:
+            result = self.model(image)
+            if self.output_filter is not None:
+                result = self.output_filter(result["detection_boxes"], result["detection_scores"],
+                                            result["detection_class_entities"])
+            start_time = time.perf_counter()
+            res.append({key: result[key].numpy() for key in
+                        ("detection_boxes", "detection_scores", "detection_class_entities")})
+            if timings is not None:
+                timings.add('transfer', time.perf_counter() - start_time)
+        return res
+
+
+"""
+Локальная модель в формате SavedModel, которая принимает батч [B, H, W, 3] и возвращает выходы с размерностью батча
+(detection_boxes - [B, N, 4], detection_scores - [B, N], detection_class_entities - [B, N])
+"""
+class SavedModelDetector:
+    supports_batching = True
+
+    def __init__(self, path, signature='serving_default', output_filter=None):
+        import tensorflow as tf
+        self.tf = tf
+        self.model = tf.saved_model.load(path).signatures[signature]
+        self.output_filter = output_filter
+
+    def detect(self, images, timings=None):
+        batch = self.tf.concat(images, axis=0) if len(images) > 1 else images[0]
+        result = self.model(batch)
+        if self.output_filter is not None:
+            #После отбора у изображений разное количество объектов, поэтому дальше они обрабатываются по отдельности
+            filtered = [self.output_filter(result["detection_boxes"][i], result["detection_scores"][i],
+                                           result["detection_class_entities"][i]) for i in range(len(images))]
+            start_time = time.perf_counter()
+            res = [{key: value.numpy() for key, value in item.items()} for item in filtered]
+            if timings is not None:
+                timings.add('transfer', time.perf_counter() - start_time)
+            return res
+        start_time = time.perf_counter()
+        result = {key: result[key].numpy() for key in
+                  ("detection_boxes", "detection_scores", "detection_class_entities")}
+        if timings is not None:
+            timings.add('transfer', time.perf_counter() - start_time)
+        return [{key: value[i] for key, value in result.items()} for i in range(len(images))]
+
+
+"""
+Заглушка модели на numpy для тестов и бенчмарков без сети и без GPU
+Результат детерминированно зависит от содержимого изображения
+call_overhead - время (в секундах), которое имитирует фиксированные затраты на один вызов модели
+"""
+class StubDetector:
+    supports_batching = True
+
+    ENTITIES = np.array([b'Fish', b'Jellyfish', b'Penguin', b'Bird', b'Shark', b'Starfish', b'Rays and skates',
+                         b'Animal', b'Plant', b'Tree', b'Marine mammal', b'Marine invertebrates'], dtype=object)
+
+    def __init__(self, num_detections=100, call_overhead=0.0):
+        self.num_detections = num_detections
+        self.call_overhead = call_overhead
+
+    def detect(self, images, timings=None):
+        if self.call_overhead:
+            time.sleep(self.call_overhead)
+        batch = np.concatenate([np.asarray(image, dtype=np.float32) for image in images], axis=0)
+        #Работа, пропорциональная размеру изображений, как у настоящей модели
+        features = batch.mean(axis=(1, 2, 3))
+        res = []
+        for i in range(len(images)):
+            #RandomState принимает только seed < 2**32
+            seed = (zlib.crc32(np.float32(features[i]).tobytes()) + batch.shape[1] * batch.shape[2]) % 2 ** 32
+            rnd = np.random.RandomState(seed)
+            corners = rnd.rand(self.num_detections, 2, 2).astype(np.float32)
+            boxes = np.concatenate([corners.min(axis=1), corners.max(axis=1)], axis=1)
+            scores = np.sort(rnd.rand(self.num_detections).astype(np.float32) ** 3)[::-1]
+            entities = self.ENTITIES[rnd.randint(len(self.ENTITIES), size=self.num_detections)]
+            res.append({"detection_boxes": boxes, "detection_scores": scores, "detection_class_entities": entities})
+        return res
+
+
+"""
+Описание модели-заглушки: 'stub' или 'stub:<call_overhead>' (например, 'stub:0.02')
+"""
+def is_stub(spec):
+    return spec.split(':', 1)[0] == 'stub'
+
+
+"""
+Создание модели по строке-описанию:
+'stub', 'stub:<call_overhead>' - StubDetector
+путь к существующей директории - SavedModelDetector
+иначе - HubDetector (module handle на tfhub.dev)
+output_filter - None или словарь аргументов GraphOutputFilter (только для моделей TensorFlow;
+словарь, а не сам фильтр, чтобы его можно было передать в другой процесс)
+"""
+def load_detector(spec, output_filter=None):
+    if is_stub(spec):
+        return StubDetector(call_overhead=float(spec.split(':', 1)[1]) if ':' in spec else 0.0)
+    graph_filter = GraphOutputFilter(**output_filter) if output_filter is not None else None
+    if os.path.isdir(spec):
+        return SavedModelDetector(spec, output_filter=graph_filter)
+    return HubDetector(spec, output_filter=graph_filter)
+
+
+"""
+Модель, которая загружается только при первом вызове detect (например, если все результаты есть в кэше, она не загружается вовсе)
+"""
+class LazyDetector:
+    def __init__(self, spec, output_filter=None):
+        self.spec = spec
+        self.output_filter = output_filter
+        self.detector = None
+
+    @property
+    def supports_batching(self):
+        return self.get().supports_batching
+
+    def get(self):
+        if self.detector is None:
+            self.detector = load_detector(self.spec, self.output_filter)
+        return self.detector
+
+    def detect(self, images, timings=None):
+        return self.get().detect(images, timings)
+
+
+"""
+Запуск модели батчами
+items - итератор троек (key, img, converted_img), где converted_img - тензор [1, H, W, 3] или None,
+если для этого изображения модель запускать не нужно
+batch_size - максимальный размер батча; изображения группируются по размеру, так как в один батч можно объединить только изображения одного размера
+max_pending - максимальное количество изображений, ожидающих своего батча; при превышении обрабатывается самая старая группа
+
+Генератор возвращает четверки (key, img, result, time) в том же порядке, что и items:
+result - словарь с результатами модели (или None), time - время работы модели в пересчете на одно изображение
+Если передан timings, в этап 'inference' записываются время и рост пиковой памяти каждого вызова модели,
+а в счетчик 'batches' - количество вызовов
+"""
+def run_batched(detector, items, batch_size, max_pending=None, timings=None):
+    if max_pending is None:
+        max_pending = 4 * batch_size
+
+    order = []
+    done = {}
+    groups = {}
+    pending = 0
+    position = 0
+    #Поддерживает ли модель батчи, проверяем только при первом изображении, для которого ее нужно запустить,
+    #чтобы LazyDetector не загружал модель, если все результаты есть в кэше
+    batch_limit = None
+
+    def flush(shape):
+        images = groups.pop(shape)
+        start_time = time.perf_counter()
+        if timings is not None:
+            with timings.stage('inference'):
+                results = detector.detect([image[2] for image in images], timings)
+            timings.count('batches')
+        else:
+            results = detector.detect([image[2] for image in images])
+        time_elapsed = time.perf_counter() - start_time
+        for (index, img, converted_img), result in zip(images, results):
+            done[index] = (img, result, time_elapsed / len(images))
+        return len(images)
+
+    for key, img, converted_img in items:
+        index = len(order)
+        order.append(key)
+        if converted_img is None:
+            done[index] = (img, None, None)
+        else:
+            if batch_limit is None:
+                batch_limit = batch_size if batch_size == 1 or detector.supports_batching else 1
+            shape = tuple(converted_img.shape)
+            groups.setdefault(shape, []).append((index, img, converted_img))
+            pending += 1
+            if len(groups[shape]) >= batch_limit:
+                pending -= flush(shape)
+            elif pending > max_pending:
+                oldest = min(groups, key=lambda s: groups[s][0][0])
+                pending -= flush(oldest)
+
+        while position in done:
+            img, result, time_elapsed = done.pop(position)
+            yield order[position], img, result, time_elapsed
+            position += 1
+
+    for shape in sorted(groups, key=lambda s: groups[s][0][0]):
+        flush(shape)
+    while position in done:
+        img, result, time_elapsed = done.pop(position)
+        yield order[position], img, result, time_elapsed
+        position += 1
@@ -0,0 +1,151 @@
+import numpy as np
+
+import matching
+
+"""
+Оценка модели сразу для всех порогов SCORE_THRESHOLD и набора порогов IOU_THRESHOLD за один проход по изображениям
+
+Для каждого изображения и класса обнаруженные объекты сортируются по убыванию score и сопоставляются с groundtruth
+(как в COCO): очередной объект сопоставляется с еще не занятым groundtruth объектом с наибольшим iou, если iou >= порога
+При таком порядке статус объекта (true positive или нет) зависит только от объектов с большим score, то есть не зависит от SCORE_THRESHOLD,
+поэтому precision и recall для всех SCORE_THRESHOLD сразу получаются накопленными суммами true positives и false positives
+по объектам, отсортированным по убыванию score
+
+Матрица iou считается один раз на изображение и класс и используется для всех порогов IOU_THRESHOLD
+"""
+
+#Пороги IOU_THRESHOLD как в COCO: 0.5, 0.55, ..., 0.95
+COCO_IOU_THRESHOLDS = np.linspace(0.5, 0.95, 10)
+
+#Точки recall, в которых усредняется precision при вычислении average precision (как в COCO)
+RECALL_POINTS = np.linspace(0, 1, 101)
+
+
+"""
+Сопоставление в порядке убывания score для всех порогов iou сразу
+ious - матрица iou (обнаруженные объекты, отсортированные по убыванию score) x (groundtruth объекты)
+iou_thresholds - массив порогов
+
+Функция возвращает булев массив формы (len(iou_thresholds), число обнаруженных объектов): является ли объект true positive при данном пороге
+"""
+def match_by_score(ious, iou_thresholds):
+    tp = np.zeros((len(iou_thresholds), ious.shape[0]), dtype=bool)
+    if ious.shape[1] == 0:
+        return tp
+
+    #Объекты, у которых нет ни одной пары с iou >= минимального порога, - false positives при любом пороге
+    candidates = np.flatnonzero(ious.max(axis=1) >= np.min(iou_thresholds))
+    for t in range(len(iou_thresholds)):
+        used = np.zeros(ious.shape[1], dtype=bool)
+        for i in candidates:
+            row = np.where(used, -1, ious[i])
+            j = row.argmax()
+            if row[j] >= iou_thresholds[t]:
+                used[j] = True
+                tp[t, i] = True
+    return tp
+
+"""
+Interpolated average precision (усреднение по точкам RECALL_POINTS, как в COCO)
+recall, precision - значения на кривой, упорядоченной по убыванию score
+"""
+def average_precision(recall, precision):
+    if len(recall) == 0:
+        return 0.0
+    envelope = np.maximum.accumulate(precision[::-1])[::-1]
+    indices = np.searchsorted(recall, RECALL_POINTS, side='left')
+    values = np.where(indices < len(recall), envelope[np.minimum(indices, len(recall) - 1)], 0.0)
+    return float(values.mean())
+
+
+"""
+Накопление результатов сопоставления по изображениям и вычисление кривых precision-recall и average precision
+"""
+class SweepAccumulator:
+    def __init__(self, classes, iou_thresholds=COCO_IOU_THRESHOLDS):
+        self.classes = classes
+        self.iou_thresholds = np.asarray(iou_thresholds, dtype=np.float64)
+        self.scores = [[] for j in range(len(classes))]
+        self.tp = [[] for j in range(len(classes))]
+        self.groundtruth_counts = np.zeros(len(classes), dtype=np.int64)
+
+    """
+    Добавление одного изображения
+    Аргументы - массивы в формате matching.match_all (номер класса -1 - объект не относится к classes)
+    """
+    def add_image(self, pred_boxes, pred_scores, pred_classes, gt_boxes, gt_classes):
+        pred_boxes = np.asarray(pred_boxes).reshape(-1, 4)
+        pred_scores = np.asarray(pred_scores, dtype=np.float64)
+        pred_classes = np.asarray(pred_classes)
+        gt_boxes = np.asarray(gt_boxes).reshape(-1, 4)
+        gt_classes = np.asarray(gt_classes)
+
+        self.groundtruth_counts += np.bincount(gt_classes[gt_classes >= 0], minlength=len(self.classes))
+        for j in np.unique(pred_classes[pred_classes >= 0]):
+            pred_indices = np.flatnonzero(pred_classes == j)
+            pred_indices = pred_indices[np.argsort(-pred_scores[pred_indices], kind='stable')]
+            ious = matching.iou_matrix(pred_boxes[pred_indices], gt_boxes[gt_classes == j])
+            self.scores[j].append(pred_scores[pred_indices])
+            self.tp[j].append(match_by_score(ious, self.iou_thresholds))
+
+    """
+    Добавление результатов другого SweepAccumulator (с теми же классами и порогами) после уже добавленных изображений
+    """
+    def merge(self, other):
+        for j in range(len(self.classes)):
+            self.scores[j].extend(other.scores[j])
+            self.tp[j].extend(other.tp[j])
+        self.groundtruth_counts += other.groundtruth_counts
+
+    """
+    Функция возвращает словарь с результатами:
+    "classes" - для каждого класса словарь:
+        "scores" - score обнаруженных объектов по убыванию (каждое значение - возможный SCORE_THRESHOLD)
+        "precision", "recall" - массивы формы (len(iou_thresholds), len(scores)): precision и recall при SCORE_THRESHOLD = scores[k]
+        "ap" - average precision для каждого порога iou (nan, если groundtruth объектов класса нет)
+        "groundtruth_count" - количество groundtruth объектов
+    "map" - mean average precision по классам и порогам iou
+    "map_per_iou" - mean average precision по классам для каждого порога iou
+    """
+    def results(self):
+        res = {"iou_thresholds": self.iou_thresholds, "classes": {}}
+        ap_table = np.full((len(self.classes), len(self.iou_thresholds)), np.nan)
+        for j in range(len(self.classes)):
+            if self.scores[j]:
+                scores = np.concatenate(self.scores[j])
+                tp = np.concatenate(self.tp[j], axis=1)
+            else:
+                scores = np.zeros(0)
+                tp = np.zeros((len(self.iou_thresholds), 0), dtype=bool)
+
+            #Единственная сортировка по score для класса, дальше - накопленные суммы для всех порогов iou сразу
+            order = np.argsort(-scores, kind='stable')
+            scores = scores[order]
+            tp_cumulative = np.cumsum(tp[:, order], axis=1)
+            fp_cumulative = np.cumsum(~tp[:, order], axis=1)
+            precision = tp_cumulative / np.maximum(tp_cumulative + fp_cumulative, 1)
+            recall = tp_cumulative / max(self.groundtruth_counts[j], 1)
+
+            if self.groundtruth_counts[j] > 0:
+                ap_table[j] = [average_precision(recall[t], precision[t]) for t in range(len(self.iou_thresholds))]
+            res["classes"][self.classes[j]] = {"scores": scores, "precision": precision, "recall": recall,
+                                               "ap": ap_table[j], "groundtruth_count": int(self.groundtruth_counts[j])}
+
+        valid = self.groundtruth_counts > 0
+        res["map_per_iou"] = ap_table[valid].mean(axis=0) if valid.any() else np.full(len(self.iou_thresholds), np.nan)
+        res["map"] = float(np.mean(res["map_per_iou"]))
+        return res
+
+
+"""
+Перевод результатов SweepAccumulator.results в словарь, который можно сохранить в json
+"""
+def results_to_json(res):
+    def to_list(value):
+        return [None if np.isnan(x) else float(x) for x in np.ravel(value)] if np.ndim(value) == 1 else np.asarray(value).tolist()
+
+    return {"iou_thresholds": to_list(res["iou_thresholds"]),
+            "map": None if np.isnan(res["map"]) else res["map"],
+            "map_per_iou": to_list(res["map_per_iou"]),
+            "classes": {cl: {key: (value if key == "groundtruth_count" else to_list(value)) for key, value in class_res.items()}
+                        for cl, class_res in res["classes"].items()}}
@@ -0,0 +1,268 @@
+import json
+import sys
+import time
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import numpy as np
+
+import detectors
+import utils
+
+try:
+    import resource
+except ImportError:
+    #Windows: пиковое потребление памяти не измеряется
+    resource = None
+
+"""
+Загрузка изображений в фоне, параллельно с работой модели
+
+Пока модель обрабатывает текущее изображение, следующие изображения читаются, декодируются и переводятся в float32
+в пуле потоков (операции TensorFlow отпускают GIL, поэтому потоки действительно работают параллельно)
+Количество изображений, загруженных заранее, ограничено, поэтому память не растет с размером датасета
+"""
+
+#Количество потоков, декодирующих изображения
+LOAD_WORKERS = 2
+
+#Сколько изображений может быть загружено заранее
+PREFETCH_DEPTH = 4
+
+#Процентили времени этапов в отчете
+PERCENTILES = (50, 95, 99)
+
+
+"""
+Пиковое потребление памяти процессом (peak RSS) в мегабайтах с начала его работы или None, если его нельзя узнать
+"""
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    #macOS возвращает байты, Linux - килобайты
+    return peak / (1 << 20) if sys.platform == 'darwin' else peak / (1 << 10)
+
+
+"""
+Времена работы отдельных этапов обработки (в секундах, по изображениям или по вызовам) и счетчики событий
+
+Память: пиковое потребление памяти процессом (peak RSS) и для каждого этапа - насколько этот пик вырос во время этапа
+Для замеров через stage (этапы в вызывающем потоке идут друг за другом) рост суммируется по замерам;
+для этапов, замеренных в других потоках (add с rss_growth), берется максимальный рост за один замер,
+так как такие замеры идут параллельно и сумма засчитала бы один и тот же рост несколько раз
+Пиковая память общая для всего процесса, поэтому рост во время параллельно идущих этапов (например, загрузки
+изображений в prefetch и работы модели) засчитывается каждому из них
+Замеры дешевые (perf_counter и getrusage), поэтому включены всегда
+window - сколько последних замеров каждого этапа хранить (None - все); для долго работающих процессов (server.py),
+где процентили считаются по последним запросам, а память не должна расти
+"""
+class StageTimings:
+    def __init__(self, window=None):
+        self.times = defaultdict(list) if window is None else defaultdict(lambda: deque(maxlen=window))
+        self.counters = defaultdict(int)
+        self.peak_rss = None
+        self.rss_growth = defaultdict(float)
+        self.max_rss_growth = {}
+
+    """
+    rss_growth - рост пиковой памяти во время этапа, если этап замерен в другом потоке (в мегабайтах)
+    """
+    def add(self, stage, seconds, rss_growth=None):
+        self.times[stage].append(seconds)
+        peak = peak_rss_mb()
+        if peak is not None:
+            self.peak_rss = peak if self.peak_rss is None else max(self.peak_rss, peak)
+        if rss_growth is not None:
+            self.max_rss_growth[stage] = max(self.max_rss_growth.get(stage, 0.0), rss_growth)
+
+    def count(self, name, value=1):
+        self.counters[name] += value
+
+    """
+    Замер этапа: with timings.stage('match'): ...
+    """
+    @contextmanager
+    def stage(self, stage):
+        peak_before = peak_rss_mb()
+        start_time = time.perf_counter()
+        yield
+        self.add(stage, time.perf_counter() - start_time)
+        if peak_before is not None:
+            self.rss_growth[stage] += self.peak_rss - peak_before
+
+    """
+    Объединение с замерами другого процесса: времена, счетчики и рост памяти по этапам складываются,
+    для пиковой памяти и максимального роста за один замер берется максимум
+    """
+    def merge(self, other):
+        for stage, values in other.times.items():
+            self.times[stage].extend(values)
+        for name, value in other.counters.items():
+            self.counters[name] += value
+        if other.peak_rss is not None:
+            self.peak_rss = other.peak_rss if self.peak_rss is None else max(self.peak_rss, other.peak_rss)
+        for stage, growth in other.rss_growth.items():
+            self.rss_growth[stage] += growth
+        for stage, growth in other.max_rss_growth.items():
+            self.max_rss_growth[stage] = max(self.max_rss_growth.get(stage, 0.0), growth)
+
+    """
+    Функция возвращает словарь, который можно сохранить в json:
+    "stages" - для каждого этапа количество замеров, среднее, суммарное время, процентили PERCENTILES (в секундах)
+    и рост пиковой памяти (в мегабайтах): "peak_rss_growth_mb" (сумма по замерам через stage)
+    или "max_peak_rss_growth_mb" (максимум за один замер в другом потоке)
+    "counters" - счетчики
+    "peak_rss_mb" - пиковая память процесса
+    """
+    def summary(self):
+        stages = {}
+        for stage, values in self.times.items():
+            values = np.asarray(values, dtype=np.float64)
+            res = {"n": len(values), "mean": float(values.mean()), "total": float(values.sum())}
+            for q, value in zip(PERCENTILES, np.percentile(values, PERCENTILES)):
+                res["p{}".format(q)] = float(value)
+            if stage in self.rss_growth:
+                res["peak_rss_growth_mb"] = self.rss_growth[stage]
+            if stage in self.max_rss_growth:
+                res["max_peak_rss_growth_mb"] = self.max_rss_growth[stage]
+            stages[stage] = res
+        return {"stages": stages, "counters": dict(self.counters), "peak_rss_mb": self.peak_rss}
+
+    """
+    Сохранение summary в json; info - дополнительные поля (например, общее время работы)
+    """
+    def save(self, path, **info):
+        res = self.summary()
+        res.update(info)
+        with open(path, mode='w') as f:
+            json.dump(res, f, indent=2)
+
+    """
+    Функция возвращает строки отчета: для каждого этапа количество замеров, среднее, процентили, суммарное время
+    и рост пиковой памяти во время этапа (если он замерялся), затем счетчики и пиковая память процесса
+    Этапы decode и convert входят в load (prefetch), transfer - в inference (detectors.run_batched)
+    """
+    def report(self):
+        lines = []
+        summary = self.summary()
+        for stage, res in summary["stages"].items():
+            line = '{:<12} n = {:<6} mean = {:8.4f}  p50 = {:8.4f}  p95 = {:8.4f}  p99 = {:8.4f}  total = {:8.2f} sec'.format(
+                stage, res["n"], res["mean"], res["p50"], res["p95"], res["p99"], res["total"])
+            if "peak_rss_growth_mb" in res:
+                line += '  peak RSS growth = {:7.1f} MB'.format(res["peak_rss_growth_mb"])
+            if "max_peak_rss_growth_mb" in res:
+                line += '  peak RSS growth = {:7.1f} MB max per call'.format(res["max_peak_rss_growth_mb"])
+            lines.append(line)
+        for name, value in self.counters.items():
+            lines.append('{:<12} {}'.format(name, value))
+        if summary["peak_rss_mb"] is not None:
+            lines.append('{:<12} {:.1f} MB'.format('peak RSS', summary["peak_rss_mb"]))
+        return lines
+
+
+"""
+Чтение, декодирование и перевод в float32 одного изображения
+Функция возвращает изображение (для визуализации), тензор [1, H, W, 3] для модели и времена этапов decode и convert
+"""
+def load_and_convert(path):
+    import tensorflow as tf
+
+    start_time = time.perf_counter()
+    img = utils.load_img(path)
+    decoded_time = time.perf_counter()
+    converted_img = tf.image.convert_image_dtype(img, tf.float32)[tf.newaxis, ...]
+    end_time = time.perf_counter()
+    return img, converted_img, {"decode": decoded_time - start_time, "convert": end_time - decoded_time}
+
+"""
+То же, что load_and_convert, но без TensorFlow: декодирование через PIL, изображение и тензор - массивы numpy
+Используется с моделями на numpy (detectors.StubDetector), например в бенчмарках на машине без TensorFlow
+"""
+def load_and_convert_numpy(path):
+    from PIL import Image
+
+    start_time = time.perf_counter()
+    with Image.open(path) as image:
+        img = np.asarray(image.convert("RGB"))
+    decoded_time = time.perf_counter()
+    converted_img = (img.astype(np.float32) / 255)[np.newaxis, ...]
+    end_time = time.perf_counter()
+    return img, converted_img, {"decode": decoded_time - start_time, "convert": end_time - decoded_time}
+
+
+"""
+Функция загрузки изображений для модели, заданной строкой-описанием (см. detectors.load_detector)
+"""
+def loader_for(spec):
+    return load_and_convert_numpy if detectors.is_stub(spec) else load_and_convert
+
+
+"""
+То же, что load_and_convert, но для JPEG, уже прочитанного в память (например, из запроса к server.py)
+"""
+def decode_and_convert(data):
+    import tensorflow as tf
+
+    start_time = time.perf_counter()
+    img = tf.image.decode_jpeg(data, channels=3)
+    decoded_time = time.perf_counter()
+    converted_img = tf.image.convert_image_dtype(img, tf.float32)[tf.newaxis, ...]
+    end_time = time.perf_counter()
+    return img, converted_img, {"decode": decoded_time - start_time, "convert": end_time - decoded_time}
+
+
+def decode_and_convert_numpy(data):
+    import io
+    from PIL import Image
+
+    start_time = time.perf_counter()
+    with Image.open(io.BytesIO(data)) as image:
+        img = np.asarray(image.convert("RGB"))
+    decoded_time = time.perf_counter()
+    converted_img = (img.astype(np.float32) / 255)[np.newaxis, ...]
+    end_time = time.perf_counter()
+    return img, converted_img, {"decode": decoded_time - start_time, "convert": end_time - decoded_time}
+
+
+def decoder_for(spec):
+    return decode_and_convert_numpy if detectors.is_stub(spec) else decode_and_convert
+
+
+"""
+Генератор, который возвращает (path, load_fn(path)) в порядке paths, вызывая load_fn заранее в пуле потоков
+workers - количество потоков
+depth - максимальное количество изображений, загружаемых заранее
+
+Если передан timings, в этап 'input wait' записывается время, которое основной поток ждал очередное изображение:
+если оно близко к нулю, загрузка изображений полностью скрыта за работой модели
+В этап 'load' записывается время вызова load_fn и рост пиковой памяти во время него, замеренные в потоке загрузки
+(времена decode и convert, которые возвращает load_fn, записывает вызывающий код)
+"""
+def prefetch(paths, load_fn=load_and_convert, workers=LOAD_WORKERS, depth=PREFETCH_DEPTH, timings=None):
+    def load(path):
+        peak_before = peak_rss_mb()
+        start_time = time.perf_counter()
+        result = load_fn(path)
+        seconds = time.perf_counter() - start_time
+        return result, seconds, None if peak_before is None else peak_rss_mb() - peak_before
+
+    paths = iter(paths)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        window = deque()
+        for path in paths:
+            window.append((path, pool.submit(load, path)))
+            if len(window) >= depth:
+                break
+        while window:
+            path, future = window.popleft()
+            start_time = time.perf_counter()
+            result, load_seconds, rss_growth = future.result()
+            if timings is not None:
+                timings.add('input wait', time.perf_counter() - start_time)
+                timings.add('load', load_seconds, rss_growth)
+            next_path = next(paths, None)
+            if next_path is not None:
+                window.append((next_path, pool.submit(load, next_path)))
+            yield path, result
@@ -1,10 +1,17 @@
-import tensorflow as tf
-import tensorflow_hub as hub
 import utils
 import time
 import matching
 import os
-import gc
+import json
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import evaluation
+import pipeline
+import detectors
+from detection_cache import DetectionCache
+from boxes import Boxes, Vocabulary
 
 """
 Для каждого изображения запустим модель обнаружения объектов и сравним результаты её работы с groundtruth 
@@ -33,110 +40,446 @@ os.environ["CUDA_VISIBLE_DEVICES"] = "-1" #При раскомментирова
 
 DO_VISUALIZE = False
 
+#Директория, в которую в фоне сохраняются изображения с рамками при DO_VISUALIZE (None - показывать каждое изображение на экране)
+VISUALIZE_DIR = "output"
+
 #Порог prediction score, при превышении которого будет считаться, что модель обнаружила объект
 SCORE_THRESHOLD = 0.3
 
 #Порог меры 'intersection over union' для сопоставления обнаруженного объекта с groundtruth
 IOU_THRESHOLD = 0.6
 
+#Способ сопоставления обнаруженных объектов с groundtruth для SCORE_THRESHOLD и IOU_THRESHOLD (см. matching.ASSIGNMENTS):
+#'greedy' - жадно по убыванию iou, 'optimal' - максимальное количество пар, затем максимальная сумма iou
+#Кривые precision-recall (DO_SWEEP) всегда строятся сопоставлением в порядке убывания score, как в COCO
+ASSIGNMENT = 'greedy'
+
 CLASSES = ['Fish', 'Jellyfish', 'Penguin', 'Bird', 'Shark', 'Starfish', 'Rays and skates']
 
+#Выходной этап модели: модель возвращает объекты всех 600 классов OpenImages, а нужны только CLASSES
+#Метки модели, которые тоже считаются классами из CLASSES: словарь (метка модели -> метка из CLASSES), например {'Duck': 'Bird'}
+#(в самом CLASSES уже используются метки модели: 'Bird' вместо 'Puffin', 'Rays and skates' вместо 'Stingray')
+CLASS_ALIASES = {}
+
+#Отбрасывать объекты не из CLASSES сразу после модели (и после чтения из кэша), над массивами numpy, до сопоставления и визуализации
+#В кэш записываются все результаты модели, поэтому эта настройка, SCORE_FLOOR и CLASSES на кэш не влияют
+CLASSES_ONLY = True
+
+#Объекты со score < SCORE_FLOOR отбрасываются там же (None - без отбора по score)
+#SCORE_FLOOR <= SCORE_THRESHOLD не меняет precision и recall; кривые precision-recall (DO_SWEEP) обрываются на SCORE_FLOOR
+SCORE_FLOOR = None
+
+#Отбор внутри графа TensorFlow, до перевода результатов в numpy (detectors.GraphOutputFilter, для 'stub' не используется):
+#только CLASSES со score >= SCORE_FLOOR и не более GRAPH_TOP_K объектов каждого класса после NMS с порогом GRAPH_NMS_IOU
+#(оба None - не использовать; GRAPH_NMS_IOU = None - без NMS; GRAPH_TOP_K = None при заданном GRAPH_NMS_IOU -
+#GRAPH_MAX_TOP_K, то есть только NMS)
+GRAPH_TOP_K = None
+GRAPH_NMS_IOU = None
+
+#Сколько объектов всего возвращает модель (Faster R-CNN OpenImages v4 - 100), больше на один класс не бывает
+GRAPH_MAX_TOP_K = 100
+
+#Директория кэша результатов работы модели (None - не использовать кэш)
+#При повторном запуске модель запускается только для новых или изменившихся изображений,
+#поэтому изменение SCORE_THRESHOLD, IOU_THRESHOLD или алгоритма сопоставления не требует повторного запуска модели
+CACHE_DIR = "cache"
+
+#Режим оценки сразу для всех порогов: кривые precision-recall, average precision и mAP по порогам iou 0.5:0.95 (как в COCO)
+#Считается за тот же один проход по изображениям, что и метрики для SCORE_THRESHOLD и IOU_THRESHOLD,
+#но хранит score каждого объекта CLASSES до конца работы, поэтому память растет с размером датасета
+#(см. benchmarks/bench_memory.py); по умолчанию выключен, включается подкомандой sweep
+DO_SWEEP = False
+
+#Файл, в который сохраняются кривые precision-recall (None - не сохранять)
+SWEEP_OUTPUT = None
+
+#Модель: module handle на tfhub.dev, путь к локальной SavedModel или 'stub' (заглушка без TensorFlow, см. detectors.load_detector)
+DETECTOR = "https://tfhub.dev/google/faster_rcnn/openimages_v4/inception_resnet_v2/1"
+
+#Максимальный размер батча (изображения одного размера обрабатываются за один вызов модели, если модель это поддерживает)
+BATCH_SIZE = 1
+
+#Файл, в который сохраняются времена этапов обработки (процентили p50/p95/p99), пиковая память и счетчики (None - не сохранять)
+TIMINGS_OUTPUT = None
+
+#Настройки выше, которые можно изменить из командной строки (см. main); они передаются и в процессы-обработчики
+SETTINGS = ("DO_VISUALIZE", "VISUALIZE_DIR", "SCORE_THRESHOLD", "IOU_THRESHOLD", "ASSIGNMENT", "CACHE_DIR", "DO_SWEEP",
+            "SWEEP_OUTPUT", "DETECTOR", "BATCH_SIZE", "TIMINGS_OUTPUT", "CLASS_ALIASES", "CLASSES_ONLY", "SCORE_FLOOR",
+            "GRAPH_TOP_K", "GRAPH_NMS_IOU")
+
+#Директории с изображениями и аннотациями
+DATA_FOLDERS = ["data//train", "data//test", "data//valid"]
+
+"""
+Аргументы detectors.GraphOutputFilter для отбора внутри графа (None, если не заданы ни GRAPH_TOP_K, ни GRAPH_NMS_IOU)
+"""
+def graph_filter():
+    if GRAPH_TOP_K is None and GRAPH_NMS_IOU is None:
+        return None
+    return {"classes": CLASSES, "aliases": CLASS_ALIASES, "score_floor": SCORE_FLOOR,
+            "top_k": GRAPH_MAX_TOP_K if GRAPH_TOP_K is None else GRAPH_TOP_K, "nms_iou": GRAPH_NMS_IOU}
+
 """
-Запускаем модель на одном изображении
-Функция возвращает 
-1)изображение (для визуализации)
-2)список обнаруженных объектов в формате: каждый объект - словарь, который содержит bounding box (список относительных координат в формате x1,y1,x2,y2), метку класса и confidence score
-3)время работы модели
-"""
-def run_detector(detector, path):
-    img = utils.load_img(path)
-    converted_img = tf.image.convert_image_dtype(img, tf.float32)[tf.newaxis, ...]
-    start_time = time.time()
-    result = detector(converted_img)
-    end_time = time.time()
-    result = {key: value.numpy() for key, value in result.items()}
-
-    res_objects = []
-    for i in range(len(result["detection_boxes"])):
-        object = {}
-        object['bbox'] = list(result["detection_boxes"][i])
-        object['score'] = result["detection_scores"][i]
-        object['class'] = str(result["detection_class_entities"][i]).replace('b\'', '').replace('\'', '')
-        object['type'] = 'prediction'
-        res_objects.append(object)
-
-    time_elapsed = end_time - start_time
-    gc.collect()
-    return img, res_objects, time_elapsed
-
-#Загружаем модель
-module_handle = "https://tfhub.dev/google/faster_rcnn/openimages_v4/inception_resnet_v2/1"
-detector = hub.load(module_handle).signatures['default']
-
-#Собираем метаинформацию обо всех входных данных (пути к файлам и groundtruth объекты)
-res = utils.collect_data(["data//train", "data//test", "data//valid"], CLASSES)
-keys = list(res.keys())
-
-#Список groundtruth объектов (по классам)
-groundtruth_arrays = [[] for i in range(len(CLASSES))]
-
-#Список обнаруженных объектов (по классам)
-predictions_arrays = [[] for i in range(len(CLASSES))]
-
-#Список true positive объектов (по классам)
-matched_arrays = [[] for i in range(len(CLASSES))]
-
-#Список времен работы модели для каждого изображения
-time_array = []
-
-for i in range(len(keys)):
-    key = keys[i]
-    path = res[key]["path"]
-    img, predicted, t = run_detector(detector, path)
-    groundtruth = res[key]["objects"]
-    time_array.append(t)
-
-    extra = []
-    for j in range(len(CLASSES)):
-        #Для каждого класса запускаем алгоритм выделения true positives
+Ключ кэша результатов модели: DETECTOR и настройки, от которых зависят записываемые в кэш результаты -
+CLASS_ALIASES (в кэш записываются метки уже после замены) и аргументы отбора внутри графа (в них входят CLASSES и SCORE_FLOOR)
+При изменении этих настроек используется отдельный кэш; при настройках по умолчанию ключ - просто DETECTOR
+"""
+def cache_key():
+    options = {}
+    if CLASS_ALIASES:
+        options["aliases"] = CLASS_ALIASES
+    if graph_filter() is not None:
+        options["graph_filter"] = graph_filter()
+    return DETECTOR + '#' + json.dumps(options, sort_keys=True) if options else DETECTOR
+
+"""
+Оценка модели на части изображений в текущем процессе
+res - результат utils.collect_data, keys - ключи изображений, cache - DetectionCache (или None)
+Новые результаты модели в кэш не записываются, а возвращаются, чтобы кэш записывал только один процесс
+
+Функция возвращает сводку без списков объектов - словарь:
+"counts" - массив формы (3, len(CLASSES)): количество true positives, обнаруженных объектов и groundtruth объектов по классам
+"sweep" - SweepAccumulator (если DO_SWEEP)
+"times" - список времен работы модели
+"timings" - времена этапов обработки (pipeline.StageTimings)
+"new_detections" - список четверок (хэш изображения, boxes, scores, classes) для изображений, на которых запускалась модель
+"""
+def evaluate_keys(res, keys, cache):
+    #Модель загружается при первом промахе кэша
+    detector = detectors.LazyDetector(DETECTOR, graph_filter())
+    vocabulary = Vocabulary(CLASSES, CLASS_ALIASES)
+    timings = pipeline.StageTimings()
+    counts = np.zeros((3, len(CLASSES)), dtype=np.int64)
+    sweep = evaluation.SweepAccumulator(CLASSES) if DO_SWEEP else None
+    time_array = []
+    new_detections = []
+    exporter = utils.ImageExporter(VISUALIZE_DIR) if DO_VISUALIZE and VISUALIZE_DIR is not None else None
+
+    #Сначала определяем, для каких изображений результаты уже есть в кэше
+    image_hashes = []
+    cached = []
+    for key in keys:
+        if cache is None:
+            image_hashes.append(None)
+            cached.append(None)
+            continue
+        with timings.stage('cache'):
+            image_hashes.append(cache.image_hash(res[key]["path"]))
+            cached.append(cache.get_arrays(image_hashes[-1]))
+    timings.count('images', len(keys))
+    timings.count('cache hits', sum(arrays is not None for arrays in cached))
+
+    #Изображения, которые нужно загрузить (для модели или для визуализации), загружаются в фоне в том же порядке, что и keys
+    images = pipeline.prefetch([res[keys[i]]["path"] for i in range(len(keys)) if cached[i] is None or DO_VISUALIZE],
+                               load_fn=pipeline.loader_for(DETECTOR), timings=timings)
+
+    """
+    Изображения в порядке keys: для тех, которых нет в кэше, - загруженное изображение и тензор для модели,
+    для остальных - изображение только при визуализации
+    """
+    def image_stream():
+        for i in range(len(keys)):
+            if cached[i] is None or DO_VISUALIZE:
+                loaded_path, (img, converted_img, load_times) = next(images)
+                for stage, seconds in load_times.items():
+                    timings.add(stage, seconds)
+                yield i, img, converted_img if cached[i] is None else None
+            else:
+                yield i, None, None
+
+    for i, img, result, t in detectors.run_batched(detector, image_stream(), BATCH_SIZE, timings=timings):
+        key = keys[i]
+        if result is None:
+            boxes, scores, class_ids = cached[i]
+            predicted = Boxes.select(boxes, scores, vocabulary.remap(cache.entities)[class_ids], vocabulary,
+                                     CLASSES_ONLY, SCORE_FLOOR)
+        elif cache is None:
+            with timings.stage('extract'):
+                predicted = Boxes.from_detector(result, vocabulary, CLASSES_ONLY, SCORE_FLOOR)
+            time_array.append(t)
+        else:
+            #В кэш записываются все результаты модели, отбор - как при чтении из кэша
+            with timings.stage('extract'):
+                detected = Boxes.from_detector(result, vocabulary)
+                predicted = Boxes.select(detected.boxes, detected.scores, detected.class_ids, vocabulary,
+                                         CLASSES_ONLY, SCORE_FLOOR)
+            time_array.append(t)
+            new_detections.append((image_hashes[i], detected.boxes, detected.scores,
+                                   [vocabulary.names[class_id] for class_id in detected.class_ids]))
+        groundtruth = res[key]["objects"]
+        timings.count('detections', len(predicted))
+
+        #Запускаем алгоритм выделения true positives сразу для всех классов
         #объект считается true positive, если его score >= SCORE_THRESHOLD и он сопоставляется с каким-то объектом из groundtruth (IOU >= IOU_THRESHOLD)
-        matched, class_predictions, class_groundtruth = matching.match(predicted, groundtruth, CLASSES[j],
-                                                                       SCORE_THRESHOLD, IOU_THRESHOLD)
-        groundtruth_arrays[j].extend(class_groundtruth)
-        predictions_arrays[j].extend(class_predictions)
-        matched_arrays[j].extend(matched)
+        #Для метрик накапливаем только количества объектов по классам, сами объекты не сохраняются
+        with timings.stage('match'):
+            matched, pred_indices, gt_indices, pred_classes, gt_classes = matching.match_boxes(
+                predicted, groundtruth, vocabulary, SCORE_THRESHOLD, IOU_THRESHOLD, ASSIGNMENT)
+            counts[0] += np.bincount(pred_classes[matched[:, 0]], minlength=len(CLASSES))
+            counts[1] += np.bincount(pred_classes[pred_indices], minlength=len(CLASSES))
+            counts[2] += np.bincount(gt_classes[gt_indices], minlength=len(CLASSES))
+        if DO_SWEEP:
+            with timings.stage('aggregate'):
+                sweep.add_image(predicted.boxes, predicted.scores, pred_classes, groundtruth.boxes, gt_classes)
 
+        #При визуализации рисуем:
+        #синим цветом - рамки для groundtruth
+        #красным цветом - рамки для predicted
+        #зеленым цветом - рамки для true positives
+        #Поскольку для любого true positive будет нарисована зеленая рамка поверх красной,
+        #визуально будет казаться, что красные рамки построены только для тех predictions, для которых не нашлось пары
         if DO_VISUALIZE:
-            for k in range(len(matched)):
-                matched[k][0]['type'] = 'match'
-                extra.append(matched[k][0])
-
-    #При визуализации рисуем:
-    #синим цветом - рамки для groundtruth
-    #красным цветом - рамки для predicted
-    #зеленым цветом - рамки для true positives
-    #Поскольку для любого true positive будет нарисована зеленая рамка поверх красной,
-    #визуально будет казаться, что красные рамки построены только для тех predictions, для которых не нашлось пары
-    if DO_VISUALIZE:
-        objects = []
-        objects.extend(groundtruth)
-        objects.extend(predicted)
-        objects.extend(extra)
-
-        image_with_boxes = utils.draw_boxes(img.numpy(), objects, SCORE_THRESHOLD)
-        utils.display_image(image_with_boxes)
-
-#Вычисляем метрики
-for j in range(len(CLASSES)):
-    matched_count = len(matched_arrays[j])
-    groundtruth_count = len(groundtruth_arrays[j])
-    predictions_count = len(predictions_arrays[j])
-
-    if predictions_count != 0 and groundtruth_count != 0:
-        #precision - отношение true positives к количеству всех обнаруженных объектов данного класса
-        #recall - отношение true positives к количеству всех groundtruth объектов данного класса
-        precision = matched_count / predictions_count
-        recall = matched_count / groundtruth_count
-        print(CLASSES[j] + ": ", 'Precision = ', round(precision, 3), '  Recall = ', round(recall, 3))
-
-print('Average time', round(sum(time_array) / len(time_array), 2), 'sec')
+            objects = [groundtruth, predicted, predicted.take(matched[:, 0], 'match')]
+            if exporter is not None:
+                with timings.stage('render'):
+                    exporter.submit(key.replace('/', '_') + '.jpg', np.asarray(img), objects, vocabulary, SCORE_THRESHOLD)
+            else:
+                with timings.stage('render'):
+                    image_with_boxes = utils.draw_boxes(np.array(img), objects, vocabulary, SCORE_THRESHOLD)
+                utils.display_image(image_with_boxes)
+
+    if exporter is not None:
+        exporter.close()
+    return {"counts": counts, "sweep": sweep, "times": time_array, "timings": timings,
+            "new_detections": new_detections}
+
+"""
+Объединение сводок evaluate_keys по частям изображений
+Части объединяются в том же порядке, в котором изображения идут в keys, поэтому результат совпадает с обработкой в одном процессе
+"""
+def merge_summaries(summaries):
+    res = {"counts": np.zeros((3, len(CLASSES)), dtype=np.int64),
+           "sweep": evaluation.SweepAccumulator(CLASSES) if DO_SWEEP else None,
+           "times": [], "timings": pipeline.StageTimings(), "new_detections": []}
+    for summary in summaries:
+        res["counts"] += summary["counts"]
+        if DO_SWEEP:
+            res["sweep"].merge(summary["sweep"])
+        res["times"].extend(summary["times"])
+        res["timings"].merge(summary["timings"])
+        res["new_detections"].extend(summary["new_detections"])
+    return res
+
+"""
+Инициализация процесса-обработчика: каждый процесс использует свою часть ядер
+Переменные окружения читаются TensorFlow при инициализации, поэтому их нужно задать до первого импорта tensorflow
+settings - значения настроек SETTINGS в родительском процессе (процесс запускается через spawn и заново импортирует этот модуль)
+"""
+def init_worker(threads, settings):
+    globals().update(settings)
+    os.environ["TF_NUM_INTRAOP_THREADS"] = str(threads)
+    os.environ["TF_NUM_INTEROP_THREADS"] = "1"
+    os.environ["OMP_NUM_THREADS"] = str(threads)
+
+"""
+Обработка одной части изображений в процессе-обработчике
+shard - словарь (ключ изображения -> данные из utils.collect_data)
+"""
+def evaluate_shard(shard):
+    cache = DetectionCache(CACHE_DIR, cache_key()) if CACHE_DIR is not None else None
+    return evaluate_keys(shard, list(shard.keys()), cache)
+
+"""
+Оценка модели на изображениях keys
+workers - количество процессов; изображения делятся между ними на непрерывные части, у каждого процесса своя модель
+Функция возвращает объединенную сводку в формате evaluate_keys и сохраняет новые результаты модели в кэш
+"""
+def evaluate(res, keys, workers=1):
+    cache = DetectionCache(CACHE_DIR, cache_key()) if CACHE_DIR is not None else None
+    if workers <= 1:
+        summary = merge_summaries([evaluate_keys(res, keys, cache)])
+    else:
+        #Хэши изображений считаем и сохраняем заранее, чтобы процессы-обработчики брали их из индекса кэша
+        if cache is not None:
+            for key in keys:
+                cache.image_hash(res[key]["path"])
+            cache.save()
+        bounds = np.linspace(0, len(keys), workers + 1).astype(int)
+        shards = [{key: res[key] for key in keys[bounds[k]:bounds[k + 1]]} for k in range(workers)]
+        threads = max(1, (os.cpu_count() or 1) // workers)
+        #spawn, а не fork: процессы не должны наследовать состояние TensorFlow родительского процесса
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                                 initializer=init_worker, initargs=(threads, current_settings())) as pool:
+            summary = merge_summaries(pool.map(evaluate_shard, shards))
+
+    if cache is not None:
+        for image_hash, boxes, scores, classes in summary["new_detections"]:
+            cache.put(image_hash, boxes, scores, classes)
+        cache.save()
+    return summary
+
+def current_settings():
+    return {name: globals()[name] for name in SETTINGS}
+
+"""
+Ключи изображений, результаты модели для которых уже есть в кэше
+"""
+def cached_keys(res, keys):
+    cache = DetectionCache(CACHE_DIR, cache_key())
+    return [key for key in keys if cache.get_arrays(cache.image_hash(res[key]["path"])) is not None]
+
+"""
+Вывод метрик по сводке evaluate
+metrics - выводить ли precision и recall (при запуске только модели - нет)
+"""
+def print_report(summary, images_count, metrics=True):
+    matched_counts, predictions_counts, groundtruth_counts = summary["counts"]
+    for j in range(len(CLASSES) if metrics else 0):
+        matched_count = int(matched_counts[j])
+        groundtruth_count = int(groundtruth_counts[j])
+        predictions_count = int(predictions_counts[j])
+
+        if predictions_count != 0 and groundtruth_count != 0:
+            #precision - отношение true positives к количеству всех обнаруженных объектов данного класса
+            #recall - отношение true positives к количеству всех groundtruth объектов данного класса
+            precision = matched_count / predictions_count
+            recall = matched_count / groundtruth_count
+            print(CLASSES[j] + ": ", 'Precision = ', round(precision, 3), '  Recall = ', round(recall, 3))
+
+    if DO_SWEEP:
+        with summary["timings"].stage('metrics'):
+            sweep_results = summary["sweep"].results()
+        print()
+        print('mAP@[.5:.95] = ', round(sweep_results["map"], 3), '  mAP@.5 = ', round(sweep_results["map_per_iou"][0], 3),
+              '  mAP@.75 = ', round(sweep_results["map_per_iou"][5], 3))
+        for j in range(len(CLASSES)):
+            class_results = sweep_results["classes"][CLASSES[j]]
+            if class_results["groundtruth_count"] != 0:
+                print(CLASSES[j] + ": ", 'AP@[.5:.95] = ', round(float(class_results["ap"].mean()), 3),
+                      '  AP@.5 = ', round(float(class_results["ap"][0]), 3),
+                      '  AP@.75 = ', round(float(class_results["ap"][5]), 3),
+                      '  Operating points = ', len(class_results["scores"]))
+        if SWEEP_OUTPUT is not None:
+            with open(SWEEP_OUTPUT, mode='w') as f:
+                json.dump(evaluation.results_to_json(sweep_results), f)
+
+    time_array = summary["times"]
+    if time_array:
+        print('Average time', round(sum(time_array) / len(time_array), 2), 'sec')
+    print('Model runs:', len(time_array), ' Cache hits:', images_count - len(time_array))
+    for line in summary["timings"].report():
+        print(line)
+
+
+"""
+Командная строка
+Без подкоманды выполняется то, что задано настройками в начале файла; подкоманды:
+detect - только запуск модели на изображениях, которых нет в кэше (результаты сохраняются в кэш)
+evaluate - precision и recall при SCORE_THRESHOLD и IOU_THRESHOLD
+sweep - кривые precision-recall, average precision и mAP для всех порогов
+visualize - изображения с рамками (в --output-dir или на экране)
+serve - локальный сервис обнаружения объектов с micro-batching (см. server.py)
+TensorFlow и модель загружаются, только если каких-то результатов нет в кэше (с --cached-only - никогда),
+matplotlib - только для показа изображений на экране
+"""
+def parse_args(argv=None):
+    #default=SUPPRESS: в args попадают только явно заданные параметры, остальные берутся из настроек
+    common = argparse.ArgumentParser(add_help=False, argument_default=argparse.SUPPRESS)
+    common.add_argument('--workers', type=int, help='количество процессов для обработки изображений')
+    common.add_argument('--detector', dest='DETECTOR', help='module handle, путь к SavedModel или stub')
+    common.add_argument('--batch-size', dest='BATCH_SIZE', type=int)
+    common.add_argument('--cache-dir', dest='CACHE_DIR', help="директория кэша результатов модели ('none' - без кэша)")
+    common.add_argument('--score-threshold', dest='SCORE_THRESHOLD', type=float)
+    common.add_argument('--iou-threshold', dest='IOU_THRESHOLD', type=float)
+    common.add_argument('--assignment', dest='ASSIGNMENT', choices=matching.ASSIGNMENTS)
+    common.add_argument('--all-classes', dest='CLASSES_ONLY', action='store_false',
+                        help='не отбрасывать объекты не из CLASSES после модели')
+    common.add_argument('--score-floor', dest='SCORE_FLOOR', type=float,
+                        help='отбрасывать объекты со score ниже порога сразу после модели')
+    common.add_argument('--graph-top-k', dest='GRAPH_TOP_K', type=int,
+                        help='не более K объектов каждого класса, отбор внутри графа TensorFlow')
+    common.add_argument('--graph-nms-iou', dest='GRAPH_NMS_IOU', type=float,
+                        help='порог NMS внутри графа TensorFlow (без --graph-top-k - только NMS)')
+    common.add_argument('--timings-output', dest='TIMINGS_OUTPUT', help='файл json для времен этапов обработки')
+    common.add_argument('--limit', type=int, help='обработать только первые LIMIT изображений')
+    common.add_argument('--cached-only', action='store_true',
+                        help='использовать только изображения, результаты для которых есть в кэше (модель не загружается)')
+
+    parser = argparse.ArgumentParser(parents=[common])
+    commands = parser.add_subparsers(dest='command')
+    commands.add_parser('detect', parents=[common], help='запуск модели и сохранение результатов в кэш')
+    commands.add_parser('evaluate', parents=[common], help='precision и recall при заданных порогах')
+    sweep = commands.add_parser('sweep', parents=[common], help='кривые precision-recall, AP и mAP')
+    sweep.add_argument('--output', dest='SWEEP_OUTPUT', default=argparse.SUPPRESS, help='файл json для кривых')
+    visualize = commands.add_parser('visualize', parents=[common], help='изображения с рамками')
+    visualize.add_argument('--output-dir', dest='VISUALIZE_DIR', default=argparse.SUPPRESS,
+                           help="директория для изображений ('none' - показывать на экране)")
+    serve = commands.add_parser('serve', help='сервис обнаружения объектов (POST /detect, GET /metrics)')
+    serve.add_argument('--detector', dest='DETECTOR', default=argparse.SUPPRESS)
+    serve.add_argument('--score-floor', dest='SCORE_FLOOR', type=float, default=argparse.SUPPRESS)
+    serve.add_argument('--graph-top-k', dest='GRAPH_TOP_K', type=int, default=argparse.SUPPRESS)
+    serve.add_argument('--graph-nms-iou', dest='GRAPH_NMS_IOU', type=float, default=argparse.SUPPRESS)
+    serve.add_argument('--host', default='127.0.0.1')
+    serve.add_argument('--port', type=int, default=8000)
+    serve.add_argument('--unix-socket', default=None, help='путь к Unix socket (вместо TCP)')
+    serve.add_argument('--max-batch-size', type=int, help='по умолчанию server.MAX_BATCH_SIZE')
+    serve.add_argument('--max-latency', type=float,
+                       help='сколько секунд первое изображение батча может ждать остальные (по умолчанию server.MAX_LATENCY)')
+    serve.add_argument('--max-queue', type=int,
+                       help='размер очереди к модели, при переполнении - 503 (по умолчанию server.MAX_QUEUE)')
+    return parser.parse_args(argv)
+
+"""
+Запуск сервиса server.py с настройками командной строки
+"""
+def serve(args):
+    import asyncio
+    import server
+
+    options = {name: getattr(args, name) for name in ('max_batch_size', 'max_latency', 'max_queue')
+               if getattr(args, name) is not None}
+    print('Serving', DETECTOR, 'on', args.unix_socket or '{}:{}'.format(args.host, args.port))
+    try:
+        asyncio.run(server.serve(DETECTOR, CLASSES, args.host, args.port, args.unix_socket, aliases=CLASS_ALIASES,
+                                 score_floor=SCORE_FLOOR, output_filter=graph_filter(), **options))
+    except KeyboardInterrupt:
+        pass
+
+"""
+Применение параметров командной строки к настройкам модуля
+"""
+def apply_args(args):
+    settings = {name: value for name, value in vars(args).items() if name in SETTINGS}
+    for name in ("CACHE_DIR", "VISUALIZE_DIR"):
+        if settings.get(name, '').lower() == 'none':
+            settings[name] = None
+    if args.command == 'detect':
+        if settings.get("CACHE_DIR", CACHE_DIR) is None:
+            raise SystemExit('detect: results are only kept in the cache, --cache-dir none makes no sense')
+        settings.update(DO_SWEEP=False, DO_VISUALIZE=False)
+    elif args.command == 'evaluate':
+        settings.update(DO_SWEEP=False, DO_VISUALIZE=False)
+    elif args.command == 'sweep':
+        settings.update(DO_SWEEP=True, DO_VISUALIZE=False)
+    elif args.command == 'visualize':
+        settings.update(DO_SWEEP=False, DO_VISUALIZE=True)
+    globals().update(settings)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    apply_args(args)
+    if args.command == 'serve':
+        serve(args)
+        return
+    workers = getattr(args, 'workers', 1)
+
+    #Собираем метаинформацию обо всех входных данных (пути к файлам и groundtruth объекты)
+    res = utils.collect_data(DATA_FOLDERS, CLASSES)
+    keys = list(res.keys())
+    if getattr(args, 'cached_only', False) and CACHE_DIR is not None:
+        keys = cached_keys(res, keys)
+    if getattr(args, 'limit', None) is not None:
+        keys = keys[:args.limit]
+
+    start_time = time.perf_counter()
+    summary = evaluate(res, keys, workers)
+    print_report(summary, len(keys), metrics=args.command != 'detect')
+    wall_time = time.perf_counter() - start_time
+    print('Wall time', round(wall_time, 2), 'sec', ' Workers:', workers)
+    if TIMINGS_OUTPUT is not None:
+        summary["timings"].save(TIMINGS_OUTPUT, wall_time=wall_time, workers=workers, detector=DETECTOR)
+
+
+if __name__ == '__main__':
+    main()
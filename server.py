@@ -0,0 +1,307 @@
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import detectors
+import pipeline
+from boxes import Boxes, Vocabulary
+
+"""
+Локальный сервис обнаружения объектов для потоков с камер
+
+HTTP (по TCP или Unix socket):
+POST /detect - тело запроса - JPEG; ответ - список обнаруженных объектов в формате boxes.Boxes.to_objects
+(словари bbox, score, class, type), только классы из CLASSES со score >= score_floor
+GET /metrics - времена этапов (p50/p95/p99 по последним запросам) и счетчики в формате pipeline.StageTimings.summary
+
+Одновременные запросы собираются в небольшие батчи (micro-batching): батч отправляется в модель, когда набралось
+max_batch_size изображений, когда первое изображение батча ждет max_latency секунд или когда новых изображений
+ждать неоткуда (все принятые запросы уже в батче) - поэтому одиночные запросы не ждут max_latency
+Модель работает в отдельном потоке, декодирование JPEG - в своем пуле потоков, поэтому цикл событий не блокируется
+Количество запросов в обработке (декодирование и очередь к модели) ограничено: сверх него запрос сразу получает 503
+(backpressure), а не ждет
+"""
+
+#Максимальный размер батча
+MAX_BATCH_SIZE = 8
+
+#Сколько секунд первое изображение батча может ждать, пока набирается батч
+MAX_LATENCY = 0.01
+
+#Максимальное количество запросов в обработке (декодирование и очередь к модели); при превышении запрос получает 503
+MAX_QUEUE = 64
+
+#Количество потоков, декодирующих JPEG
+DECODE_WORKERS = 2
+
+#Максимальный размер тела запроса (в байтах)
+MAX_BODY = 32 << 20
+
+#По скольким последним замерам считаются процентили в /metrics
+METRICS_WINDOW = 10000
+
+
+class QueueFull(Exception):
+    pass
+
+
+class DecodeError(Exception):
+    pass
+
+
+"""
+Очередь изображений к модели и сборка батчей
+detector - модель из модуля detectors
+timings - pipeline.StageTimings для метрик
+"""
+class MicroBatcher:
+    def __init__(self, detector, timings, max_batch_size=MAX_BATCH_SIZE, max_latency=MAX_LATENCY, max_queue=MAX_QUEUE):
+        self.detector = detector
+        self.timings = timings
+        #Модель, которая не умеет обрабатывать батчи, получает изображения по одному, чтобы они не ждали друг друга
+        self.max_batch_size = max_batch_size if detector.supports_batching else 1
+        self.max_latency = max_latency
+        self.queue = asyncio.Queue(maxsize=max_queue)
+        #Количество изображений, которые еще декодируются и скоро попадут в очередь
+        self.incoming = 0
+        #Отдельный поток для модели: вызовы модели идут по одному, цикл событий в это время принимает запросы
+        self.executor = ThreadPoolExecutor(max_workers=1)
+
+    """
+    Постановка изображения в очередь; функция возвращает future с результатом модели для него
+    Если очередь заполнена, выбрасывается QueueFull
+    """
+    def submit(self, converted_img):
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self.queue.put_nowait((time.perf_counter(), converted_img, future))
+        except asyncio.QueueFull:
+            raise QueueFull()
+        return future
+
+    async def next_batch(self):
+        batch = [await self.queue.get()]
+        deadline = batch[0][0] + self.max_latency
+        while len(batch) < self.max_batch_size:
+            if not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+                continue
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0 or self.incoming == 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    """
+    Вызов модели в ее потоке; функция возвращает результаты и рост пиковой памяти во время вызова
+    """
+    def detect(self, images):
+        peak_before = pipeline.peak_rss_mb()
+        results = self.detector.detect(images, self.timings)
+        return results, None if peak_before is None else pipeline.peak_rss_mb() - peak_before
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self.next_batch()
+            start_time = time.perf_counter()
+            for enqueued_time, converted_img, future in batch:
+                self.timings.add('queue wait', start_time - enqueued_time)
+
+            #В один вызов модели можно объединить только изображения одного размера
+            groups = {}
+            for item in batch:
+                groups.setdefault(tuple(item[1].shape), []).append(item)
+            for items in groups.values():
+                start_time = time.perf_counter()
+                try:
+                    results, rss_growth = await loop.run_in_executor(self.executor, self.detect,
+                                                                     [item[1] for item in items])
+                except Exception as e:
+                    for item in items:
+                        if not item[2].done():
+                            item[2].set_exception(e)
+                    continue
+                self.timings.add('inference', time.perf_counter() - start_time, rss_growth)
+                self.timings.count('batches')
+                self.timings.count('batched images', len(items))
+                for item, result in zip(items, results):
+                    #Клиент мог отключиться, и future уже отменен
+                    if not item[2].done():
+                        item[2].set_result(result)
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+
+
+"""
+Сервис: разбор HTTP-запросов, декодирование, очередь к модели и фильтрация результатов по классам
+aliases, score_floor - как в boxes.Vocabulary и Boxes.select; сервис всегда возвращает только объекты классов classes
+"""
+class DetectionServer:
+    def __init__(self, detector, classes, decode_fn, max_batch_size=MAX_BATCH_SIZE, max_latency=MAX_LATENCY,
+                 max_queue=MAX_QUEUE, decode_workers=DECODE_WORKERS, aliases=None, score_floor=None):
+        self.timings = pipeline.StageTimings(window=METRICS_WINDOW)
+        self.vocabulary = Vocabulary(classes, aliases)
+        self.score_floor = score_floor
+        self.decode_fn = decode_fn
+        self.decode_pool = ThreadPoolExecutor(max_workers=decode_workers)
+        self.batcher = MicroBatcher(detector, self.timings, max_batch_size, max_latency, max_queue)
+        self.max_queue = max_queue
+        self.in_flight = 0
+
+    """
+    Декодирование и ожидание результата модели; ошибка декодирования - DecodeError
+    (ошибки модели приходят через future и выбрасываются как есть)
+    """
+    async def process(self, body):
+        loop = asyncio.get_running_loop()
+        self.batcher.incoming += 1
+        try:
+            img, converted_img, load_times = await loop.run_in_executor(self.decode_pool, self.decode_fn, body)
+        except Exception as e:
+            raise DecodeError(str(e))
+        finally:
+            self.batcher.incoming -= 1
+        for stage, seconds in load_times.items():
+            self.timings.add(stage, seconds)
+        return await self.batcher.submit(converted_img)
+
+    """
+    Обработка одного изображения; функция возвращает (статус HTTP, объект для ответа в json)
+    """
+    async def detect(self, body):
+        start_time = time.perf_counter()
+        self.timings.count('requests')
+        if self.in_flight >= self.max_queue:
+            self.timings.count('rejected')
+            return 503, {"error": "too many requests in progress"}
+
+        self.in_flight += 1
+        try:
+            result = await self.process(body)
+        except QueueFull:
+            self.timings.count('rejected')
+            return 503, {"error": "queue is full"}
+        except DecodeError as e:
+            self.timings.count('bad requests')
+            return 400, {"error": "cannot decode image: {}".format(e)}
+        except Exception as e:
+            self.timings.count('errors')
+            return 500, {"error": str(e)}
+        finally:
+            self.in_flight -= 1
+
+        predicted = Boxes.from_detector(result, self.vocabulary, True, self.score_floor)
+        objects = [{"bbox": [float(x) for x in obj["bbox"]], "score": float(obj["score"]), "class": obj["class"],
+                    "type": obj["type"]} for obj in predicted.to_objects(self.vocabulary)]
+        self.timings.add('latency', time.perf_counter() - start_time)
+        return 200, objects
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b'\r\n\r\n')
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                    break
+                lines = head.decode('latin-1').split('\r\n')
+                method, path, version = (lines[0].split(' ') + ['', '', ''])[:3]
+                headers = {}
+                for line in lines[1:]:
+                    if ':' in line:
+                        name, value = line.split(':', 1)
+                        headers[name.strip().lower()] = value.strip()
+                try:
+                    length = int(headers.get('content-length', 0))
+                except ValueError:
+                    length = -1
+                keep_alive = headers.get('connection', '').lower() != 'close' and version == 'HTTP/1.1'
+
+                #Без правильного Content-Length неизвестно, где кончается тело запроса, поэтому соединение закрывается
+                if length < 0:
+                    self.timings.count('bad requests')
+                    status, res = 400, {"error": "invalid Content-Length"}
+                    keep_alive = False
+                elif length > MAX_BODY:
+                    status, res = 413, {"error": "request body is too large"}
+                    keep_alive = False
+                else:
+                    body = await reader.readexactly(length) if length else b''
+                    if method == 'POST' and path == '/detect':
+                        status, res = await self.detect(body)
+                    elif method == 'GET' and path == '/metrics':
+                        status, res = 200, self.metrics()
+                    else:
+                        status, res = 404, {"error": "not found"}
+
+                writer.write(response(status, res, keep_alive))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    def metrics(self):
+        res = self.timings.summary()
+        res["queue"] = self.batcher.queue.qsize()
+        res["in_flight"] = self.in_flight
+        return res
+
+    def close(self):
+        self.batcher.close()
+        self.decode_pool.shutdown(wait=False)
+
+
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 413: 'Payload Too Large', 500: 'Internal Server Error',
+           503: 'Service Unavailable'}
+
+
+def response(status, res, keep_alive):
+    body = json.dumps(res).encode()
+    headers = ['HTTP/1.1 {} {}'.format(status, REASONS[status]), 'Content-Type: application/json',
+               'Content-Length: {}'.format(len(body)), 'Connection: {}'.format('keep-alive' if keep_alive else 'close')]
+    if status == 503:
+        headers.append('Retry-After: 1')
+    return ('\r\n'.join(headers) + '\r\n\r\n').encode() + body
+
+
+"""
+Запуск сервиса (работает до отмены)
+detector - модель из модуля detectors или строка-описание для detectors.load_detector
+host, port - адрес для TCP; если задан unix_socket, сервис слушает Unix socket по этому пути
+decode_fn - функция декодирования JPEG (по умолчанию pipeline.decoder_for для модели-строки, иначе на TensorFlow)
+ready - asyncio.Event, который устанавливается, когда сервис начал принимать запросы
+output_filter - аргументы detectors.GraphOutputFilter для модели-строки (None - без отбора внутри графа)
+"""
+async def serve(detector, classes, host='127.0.0.1', port=8000, unix_socket=None, decode_fn=None, ready=None,
+                output_filter=None, **kwargs):
+    loop = asyncio.get_running_loop()
+    if isinstance(detector, str):
+        if decode_fn is None:
+            decode_fn = pipeline.decoder_for(detector)
+        #Модель загружается до начала приема запросов, а не при первом запросе
+        detector = await loop.run_in_executor(None, detectors.load_detector, detector, output_filter)
+    if decode_fn is None:
+        decode_fn = pipeline.decode_and_convert
+
+    service = DetectionServer(detector, classes, decode_fn, **kwargs)
+    if unix_socket is not None:
+        server = await asyncio.start_unix_server(service.handle, path=unix_socket)
+    else:
+        server = await asyncio.start_server(service.handle, host, port)
+    batcher_task = asyncio.ensure_future(service.batcher.run())
+    if ready is not None:
+        ready.set()
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        batcher_task.cancel()
+        service.close()
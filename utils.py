@@ -1,14 +1,20 @@
-import matplotlib.pyplot as plt
 import numpy as np
-from PIL import Image
-from PIL import ImageDraw
-from PIL import ImageFont
-import tensorflow as tf
-import json
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+import functools
+import os
+import threading
+from annotations import AnnotationIndex
+
+"""
+TensorFlow, matplotlib и PIL импортируются внутри функций, которым они нужны,
+чтобы оценка по сохраненным результатам модели не тратила время на их загрузку
+"""
 
 
 def display_image(image):
+    import matplotlib.pyplot as plt
+
     fig = plt.figure(figsize=(20, 15))
     plt.grid(False)
     plt.imshow(image)
@@ -16,13 +22,50 @@ def display_image(image):
 
 
 def load_img(path):
+    import tensorflow as tf
+
     img = tf.io.read_file(path)
     img = tf.image.decode_jpeg(img, channels=3)
     return img
 
 
+"""
+Шрифт для подписей загружается один раз
+"""
+@functools.lru_cache(maxsize=None)
+def get_font():
+    from PIL import ImageFont
+
+    return ImageFont.load_default()
+
+
+"""
+Размер подписи (ширина, высота) в пикселях; подписи повторяются ("Fish: 45%"), поэтому размеры запоминаются
+"""
+@functools.lru_cache(maxsize=4096)
+def text_size(font, text):
+    if hasattr(font, 'getbbox'):
+        left, top, right, bottom = font.getbbox(text)
+        return right, bottom
+    return font.getsize(text)
+
+
+"""
+Подпись, отрисованная в маску (изображение PIL в режиме 'L'); отрисовка текста - самая дорогая часть визуализации,
+а подписи повторяются, поэтому каждая подпись отрисовывается один раз
+"""
+@functools.lru_cache(maxsize=4096)
+def text_mask(font, text):
+    from PIL import Image, ImageDraw
+
+    mask = Image.new('L', text_size(font, text), 0)
+    ImageDraw.Draw(mask).text((0, 0), text, fill=255, font=font)
+    return mask
+
+
 """
 Функция визуализации одного из обнаруженных объектов на изображения
+draw - объект ImageDraw.Draw для image (если не передан, создается новый)
 Код позаимствован из https://www.tensorflow.org/hub/tutorials/object_detection
 """
 def draw_bounding_box_on_image(image,
@@ -33,8 +76,11 @@ def draw_bounding_box_on_image(image,
                                color,
                                font,
                                thickness=4,
-                               display_str_list=()):
-    draw = ImageDraw.Draw(image)
+                               display_str_list=(),
+                               draw=None):
+    if draw is None:
+        from PIL import ImageDraw
+        draw = ImageDraw.Draw(image)
     im_width, im_height = image.size
     (left, right, top, bottom) = (xmin * im_width, xmax * im_width,
                                   ymin * im_height, ymax * im_height)
@@ -42,7 +88,7 @@ def draw_bounding_box_on_image(image,
               width=thickness,
               fill=color)
 
-    display_str_heights = [font.getsize(ds)[1] for ds in display_str_list]
+    display_str_heights = [text_size(font, ds)[1] for ds in display_str_list]
     total_display_str_height = (1 + 2 * 0.05) * sum(display_str_heights)
 
     if top > total_display_str_height:
@@ -51,78 +97,108 @@ def draw_bounding_box_on_image(image,
         text_bottom = top + total_display_str_height
 
     for display_str in display_str_list[::-1]:
-        text_width, text_height = font.getsize(display_str)
+        text_width, text_height = text_size(font, display_str)
         margin = np.ceil(0.05 * text_height)
         draw.rectangle([(left, text_bottom - text_height - 2 * margin),
                         (left + text_width, text_bottom)],
                        fill=color)
-        draw.text((left + margin, text_bottom - text_height - margin),
-                  display_str,
-                  fill="black",
-                  font=font)
+        draw.bitmap((left + margin, text_bottom - text_height - margin),
+                    text_mask(font, display_str),
+                    fill="black")
         text_bottom -= text_height - 2 * margin
 
 
+BOX_COLORS = {'groundtruth': 'blue', 'prediction': 'red', 'match': 'green'}
+
+
+"""
+Рисуем все рамки на одном изображении PIL за один проход и возвращаем его
+Параметры такие же, как у draw_boxes
+"""
+def render_boxes(image, objects, vocabulary, min_score):
+    from PIL import Image, ImageDraw
+
+    font = get_font()
+    image_pil = Image.fromarray(np.uint8(image)).convert("RGB")
+    draw = ImageDraw.Draw(image_pil)
+
+    for part in objects:
+        color = BOX_COLORS[part.kind]
+        for i in np.flatnonzero(part.scores >= min_score):
+            ymin, xmin, ymax, xmax = part.boxes[i].tolist()
+            display_str = "{}: {}%".format(vocabulary.names[part.class_ids[i]], int(100 * part.scores[i]))
+            draw_bounding_box_on_image(image_pil, ymin, xmin, ymax, xmax, color, font,
+                                       display_str_list=[display_str], draw=draw)
+    return image_pil
+
+
 """
 Функция визуализации набора обнаруженных объектов на изображения
+objects - список наборов объектов boxes.Boxes, цвет рамки определяется полем kind набора
+(наборы рисуются по порядку, поэтому следующие рамки рисуются поверх предыдущих)
+vocabulary - словарь меток классов boxes.Vocabulary
+Изображение переводится в PIL и обратно один раз, а не для каждого объекта
 Код позаимствован из https://www.tensorflow.org/hub/tutorials/object_detection и немного модифицирован
 """
-def draw_boxes(image, objects, min_score):
-    font = ImageFont.load_default()
-
-    for i in range(len(objects)):
-        obj = objects[i]
-        score = obj["score"]
-        if score >= min_score:
-            ymin, xmin, ymax, xmax = tuple(obj["bbox"])
-            display_str = "{}: {}%".format(obj["class"], int(100 * obj["score"]))
-            if obj['type'] == 'groundtruth':
-                color = 'blue'
-            if obj['type'] == 'prediction':
-                color = 'red'
-            if obj['type'] == 'match':
-                color = 'green'
-
-            image_pil = Image.fromarray(np.uint8(image)).convert("RGB")
-            draw_bounding_box_on_image(image_pil, ymin, xmin, ymax, xmax, color, font,
-                                       display_str_list=[display_str]), np.copyto(image, np.array(image_pil))
+def draw_boxes(image, objects, vocabulary, min_score):
+    np.copyto(image, np.array(render_boxes(image, objects, vocabulary, min_score)))
     return image
 
 
+"""
+Сохранение изображений с рамками в директорию в фоновых потоках, чтобы визуализация не замедляла обработку
+Количество изображений, ожидающих записи, ограничено max_pending: при превышении submit ждет, пока очередь освободится
+"""
+class ImageExporter:
+    def __init__(self, output_dir, workers=2, max_pending=8):
+        os.makedirs(output_dir, exist_ok=True)
+        self.output_dir = output_dir
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+        self.slots = threading.BoundedSemaphore(max_pending)
+        self.errors = []
+
+    """
+    name - имя файла в output_dir, остальные параметры - как у draw_boxes (image не изменяется)
+    """
+    def submit(self, name, image, objects, vocabulary, min_score):
+        self.slots.acquire()
+        future = self.pool.submit(self.export, os.path.join(self.output_dir, name), image, objects, vocabulary, min_score)
+        future.add_done_callback(self.done)
+
+    @staticmethod
+    def export(path, image, objects, vocabulary, min_score):
+        render_boxes(image, objects, vocabulary, min_score).save(path, quality=90)
+
+    def done(self, future):
+        if future.exception() is not None:
+            self.errors.append(future.exception())
+        self.slots.release()
+
+    """
+    Дожидаемся записи всех изображений (первая ошибка записи пробрасывается отсюда)
+    """
+    def close(self):
+        self.pool.shutdown(wait=True)
+        if self.errors:
+            raise self.errors[0]
+
+
 """
 Агрегируем данные из всех .json-файлов с аннотациями
+Аннотации читаются через annotations.AnnotationIndex, поэтому JSON разбирается только при первом запуске или после его изменения
 
 Формат выходных данных: map, в котором:
 ключ - конкатенация директории и номера изображения
-значение - словарь, содержащий путь к файлу, размеры изображения и список объектов
-Каждый объект - словарь, который содержит bounding box (список относительных координат в формате x1,y1,x2,y2), метку класса и confidence score (в данном случае, всегда 1.0)
+значение - annotations.ImageRecord: по ключам "path", "width", "height" и "objects" - путь к файлу, размеры изображения и groundtruth объекты
+(вычисляются при обращении из индекса аннотаций, поэтому объекты создаются только для обрабатываемых изображений)
+Объекты - boxes.Boxes: bounding boxes (относительные координаты в формате y1,x1,y2,x2), номера классов (индексы в CLASSES) и confidence score (в данном случае, всегда 1.0)
 """
 def collect_data(folders, CLASSES):
     res = defaultdict()
 
     for j in range(len(folders)):
         folder = folders[j]
-        with open(folder + '//_annotations.coco.json', mode='r') as f:
-            data = json.loads(f.read())
-
-            images_list = data["images"]
-            for i in range(len(images_list)):
-                id = folder + "_" + str(images_list[i]["id"])
-                file_path = folder + "//" + images_list[i]["file_name"]
-                res[id] = {"path": file_path, "objects": [], "width": images_list[i]["width"],
-                           "height": images_list[i]["height"]}
-
-            annotations_list = data["annotations"]
-            for i in range(len(annotations_list)):
-                id = folder + "_" + str(annotations_list[i]["image_id"])
-                box = [0, 0, 0, 0]
-                box[1] = annotations_list[i]['bbox'][0] / res[id]['width']
-                box[0] = annotations_list[i]['bbox'][1] / res[id]['height']
-                box[3] = annotations_list[i]['bbox'][0] / res[id]['width'] + annotations_list[i]['bbox'][2] / res[id][
-                    'width']
-                box[2] = annotations_list[i]['bbox'][1] / res[id]['height'] + annotations_list[i]['bbox'][3] / res[id][
-                    'height']
-                object = {'bbox': box, 'class': CLASSES[annotations_list[i]['category_id'] - 1], 'score': 1.0,
-                          'type': 'groundtruth'}
-                res[id]['objects'].append(object)
+        index = AnnotationIndex.load(folder + '//_annotations.coco.json')
+        for i, image_id in enumerate(index.image_ids.tolist()):
+            res[folder + "_" + str(image_id)] = index.record(i, folder)
     return res